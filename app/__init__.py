@@ -23,6 +23,8 @@ def create_app():
     
     # Store processor_router in app config
     app.config['processor_router'] = processor_router
+    # Resolved once so the psalm routes need a single config lookup per request
+    app.config['psalm_processor'] = processor_router.processors['psalm_processor']
     
     # Also store as direct attribute for backup
     app.processor_router = processor_router
@@ -47,6 +47,7 @@ class Settings:
     MAX_TOKENS: int = field(default_factory=lambda: int(os.getenv("MAX_TOKENS", "4096")))
     DEFAULT_TEMPERATURE: float = field(default_factory=lambda: float(os.getenv("DEFAULT_TEMPERATURE", "0.1")))
     DEFAULT_TOP_P: float = field(default_factory=lambda: float(os.getenv("DEFAULT_TOP_P", "0.9")))
+    RESPONSE_CACHE_SIZE: int = field(default_factory=lambda: int(os.getenv("RESPONSE_CACHE_SIZE", "0")))
     API_KEY: Optional[str] = field(default_factory=lambda: os.getenv("API_KEY"))
     CASSANDRA_HOSTS: str = field(default_factory=lambda: os.getenv("CASSANDRA_HOSTS", "127.0.0.1"))
     CASSANDRA_PORT: int = field(default_factory=lambda: int(os.getenv("CASSANDRA_PORT", "9042")))
@@ -161,6 +162,7 @@ def load_config(env_path: Optional[str] = None) -> Dict[str, Any]:
             - MISTRAL_API_KEY: API key for Mistral provider
             - DEFAULT_MODEL: Default model name to use
             - REQUEST_TIMEOUT: Request timeout in seconds
+            - RESPONSE_CACHE_SIZE: Entries in the exact-match response cache (0 disables it)
             - FLASK_ENV: Flask environment (development/production)
             - FLASK_DEBUG: Flask debug mode
             - FLASK_HOST: Flask host to bind to
@@ -297,6 +299,13 @@ def load_config(env_path: Optional[str] = None) -> Dict[str, Any]:
         cfg["DEFAULT_TOP_P"] = float(os.getenv("DEFAULT_TOP_P", "0.9"))
         cfg["STREAM_DEBUG_LOG"] = os.getenv("STREAM_DEBUG_LOG")
 
+        # Response cache for deterministic (temperature 0) provider calls
+        try:
+            cfg["RESPONSE_CACHE_SIZE"] = int(os.getenv("RESPONSE_CACHE_SIZE", "0"))
+        except (ValueError, TypeError):
+            logger.warning("Invalid RESPONSE_CACHE_SIZE value, disabling the response cache")
+            cfg["RESPONSE_CACHE_SIZE"] = 0
+
         # Data store configuration
         cfg["CASSANDRA_HOSTS"] = os.getenv("CASSANDRA_HOSTS", "127.0.0.1")
         try:
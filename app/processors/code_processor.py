@@ -8,6 +8,7 @@ from flask import jsonify, Response
 from app.utils.pattern_detector import PatternDetector
 from app.utils.ai_provider import AIProviderFactory
 from app.core.config import load_config
+from app.utils import json_codec
 
 logger = logging.getLogger(__name__)
 stream_logger = logging.getLogger("stream_debug")
@@ -140,9 +141,9 @@ Additional requirements:
                 for line in response:
                     if line:
                         try:
-                            # Decode bytes to string if needed
-                            if isinstance(line, bytes):
-                                line = line.decode('utf-8')
+                            # Provider lines arrive as UTF-8 bytes; parse them without decoding to str
+                            if isinstance(line, str):
+                                line = line.encode('utf-8')
                             
                             # Skip empty lines
                             if not line.strip():
@@ -150,7 +151,7 @@ Additional requirements:
                             
                             # Parse JSON line (Ollama /api/chat returns raw JSON lines)
                             try:
-                                data = json.loads(line)
+                                data = json_codec.loads(line)
                                 
                                 # Ollama /api/chat format: {"message": {"content": "...", "role": "assistant"}, "done": false}
                                 if 'message' in data:
@@ -214,9 +215,9 @@ Additional requirements:
                                         yield f"data: {json.dumps(chunk_data, ensure_ascii=False)}\n\n"
                             except json.JSONDecodeError:
                                 # Try SSE format (data: {...})
-                                if line.startswith('data: '):
+                                if line.startswith(b'data: '):
                                     try:
-                                        data = json.loads(line[6:])
+                                        data = json_codec.loads(line[6:])
                                         if 'choices' in data and data['choices']:
                                             content = data['choices'][0].get('delta', {}).get('content', '')
                                             if content:
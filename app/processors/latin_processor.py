@@ -5,6 +5,7 @@ import json
 import time
 import requests
 from app.core.config import load_config
+from app.utils import json_codec
 
 logger = logging.getLogger(__name__)
 stream_logger = logging.getLogger("stream_debug")
@@ -251,8 +252,9 @@ Word to analyze: {word_form}
                 for line in response:
                     if line:
                         try:
-                            if isinstance(line, bytes):
-                                line = line.decode('utf-8')
+                            # Provider lines arrive as UTF-8 bytes; parse them without decoding to str
+                            if isinstance(line, str):
+                                line = line.encode('utf-8')
                             
                             # Skip empty lines
                             if not line.strip():
@@ -260,7 +262,7 @@ Word to analyze: {word_form}
                             
                             # Parse JSON line (Ollama /api/chat returns raw JSON lines)
                             try:
-                                data = json.loads(line)
+                                data = json_codec.loads(line)
                                 
                                 # Ollama /api/chat format: {"message": {"content": "...", "role": "assistant"}, "done": false}
                                 if 'message' in data:
@@ -324,9 +326,9 @@ Word to analyze: {word_form}
                                         yield f"data: {json.dumps(chunk)}\n\n"
                             except json.JSONDecodeError:
                                 # Try SSE format (data: {...})
-                                if line.startswith('data: '):
+                                if line.startswith(b'data: '):
                                     try:
-                                        data = json.loads(line[6:])
+                                        data = json_codec.loads(line[6:])
                                         if 'choices' in data and data['choices']:
                                             content = data['choices'][0].get('delta', {}).get('content', '')
                                             if content:
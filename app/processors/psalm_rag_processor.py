@@ -1,8 +1,9 @@
 # app/processors/psalm_rag_processor.py
 import logging
-import json
 import time
+from flask import Response
 from app.core.config import load_config
+from app.utils import json_codec
 from app.rag.simple_cassandra_client import SimpleCassandraClient
 from app.rag.retriever import AugustineRetriever  # Updated!
 
@@ -60,23 +61,23 @@ ANSWER:
         try:
             pattern = pattern_data['pattern']
             
-            logger.info(f"🔍 DEBUG Processing pattern: {pattern}")
-            logger.info(f"🔍 DEBUG Available patterns: {list(self.prompt_templates.keys())}")
+            logger.info("🔍 DEBUG Processing pattern: %s", pattern)
+            logger.info("🔍 DEBUG Available patterns: %s", list(self.prompt_templates.keys()))
 
             if pattern == 'augustine_psalm_query':
-                logger.info(f"🔍 DEBUG Routing to _query_psalms with pattern: {pattern}")
+                logger.info("🔍 DEBUG Routing to _query_psalms with pattern: %s", pattern)
                 return self._query_psalms(pattern_data, model, stream, original_data)
             elif pattern == 'psalm_word_analysis':
-                logger.info(f"🔍 DEBUG Routing to _analyze_psalm_word with pattern: {pattern}")
+                logger.info("🔍 DEBUG Routing to _analyze_psalm_word with pattern: %s", pattern)
                 return self._analyze_psalm_word(pattern_data, model, stream, original_data)
             else:
-                logger.error(f"❌ Unsupported pattern: {pattern}")
+                logger.error("❌ Unsupported pattern: %s", pattern)
                 return {"error": f"Unsupported pattern: {pattern}"}, 400
         except Exception as e:
-            logger.error(f"❌ Processor failed in process method: {str(e)}")
-            logger.error(f"❌ Pattern data: {pattern_data}")
+            logger.error("❌ Processor failed in process method: %s", e)
+            logger.error("❌ Pattern data: %s", pattern_data)
             import traceback
-            logger.error(f"❌ Traceback: {traceback.format_exc()}")
+            logger.error("❌ Traceback: %s", traceback.format_exc())
             return {"error": f"Processor error: {str(e)}"}, 500
     
 
@@ -88,8 +89,8 @@ ANSWER:
             question = pattern_data.get('question', '')
             pattern = pattern_data.get('pattern', 'psalm_query')  # This is the actual pattern
             
-            logger.info(f"🔍 DEBUG _query_psalms received pattern: {pattern}")
-            logger.info(f"🔍 DEBUG Available prompt templates: {list(self.prompt_templates.keys())}")
+            logger.info("🔍 DEBUG _query_psalms received pattern: %s", pattern)
+            logger.info("🔍 DEBUG Available prompt templates: %s", list(self.prompt_templates.keys()))
             
             if not psalm_number:
                 return {"error": "psalm_number is required"}, 400
@@ -100,7 +101,7 @@ ANSWER:
                 if verse_number:
                     verse_number = int(verse_number)
             except (ValueError, TypeError) as e:
-                logger.error(f"Type conversion error in processor: {e}")
+                logger.error("Type conversion error in processor: %s", e)
                 return {"error": f"Invalid number format: {e}"}, 400
             
             # USE INTELLIGENT RETRIEVER
@@ -119,10 +120,10 @@ ANSWER:
                 if pattern == 'psalm_query':
                     prompt_template = self.prompt_templates.get('augustine_psalm_query')
                 if not prompt_template:
-                    logger.error(f"No suitable prompt template found for pattern: {pattern}, available: {list(self.prompt_templates.keys())}")
+                    logger.error("No suitable prompt template found for pattern: %s, available: %s", pattern, list(self.prompt_templates.keys()))
                     return {"error": f"No prompt template for pattern: {pattern}"}, 500
             
-            logger.info(f"🔍 DEBUG Using prompt template for pattern: {pattern}")
+            logger.info("🔍 DEBUG Using prompt template for pattern: %s", pattern)
             
             # FIX: Use the dynamic prompt_template variable
             prompt = prompt_template.format(context=context, question=question)
@@ -130,9 +131,9 @@ ANSWER:
             return self._call_ai_provider(prompt, model, stream, original_data, context)
             
         except Exception as e:
-            logger.error(f"❌ _query_psalms failed: {str(e)}")
+            logger.error("❌ _query_psalms failed: %s", e)
             import traceback
-            logger.error(f"❌ Traceback: {traceback.format_exc()}")
+            logger.error("❌ Traceback: %s", traceback.format_exc())
             return {"error": f"Query processing failed: {str(e)}"}, 500
 
         
@@ -179,8 +180,8 @@ ANSWER:
             messages = [{"role": "user", "content": prompt}]
             
             logger.info("=== ENHANCED PSALM RAG PROMPT ===")
-            logger.info(f"Context length: {len(context)} characters")
-            logger.info(f"Prompt preview: {prompt[:200]}...")
+            logger.info("Context length: %s characters", len(context))
+            logger.info("Prompt preview: %s...", prompt[:200])
             logger.info("=== END PROMPT ===")
             
             if stream:
@@ -195,7 +196,7 @@ ANSWER:
                 for i, chunk in enumerate(response):
                     if i < 3:  # Just check first 3 chunks
                         temp_chunks.append(chunk)
-                        logger.info(f"🔍 Chunk {i}: {chunk}")
+                        logger.info("🔍 Chunk %s: %s", i, chunk)
                     else:
                         break
                 
@@ -212,7 +213,7 @@ ANSWER:
                 return self._format_response(response, model, context)
                 
         except Exception as e:
-            logger.error(f"Psalm RAG query failed: {str(e)}")
+            logger.error("Psalm RAG query failed: %s", e)
             return {"error": f"Psalm RAG query failed: {str(e)}"}, 500
             
     
@@ -222,18 +223,30 @@ ANSWER:
             try:
                 chunk_count = 0
                 full_response = ""
+
+                # Only the delta changes between chunks; build the envelope once
+                created = int(time.time())
+                chunk_id = f'chatcmpl-{created}'
+                delta = {'content': ''}
+                chunk_data = {
+                    'id': chunk_id,
+                    'object': 'chat.completion.chunk',
+                    'created': created,
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'delta': delta,
+                        'finish_reason': None
+                    }]
+                }
                 
                 for line in response:
                     if line:
                         try:
-                            # Decode if it's bytes
-                            if isinstance(line, bytes):
-                                line = line.decode('utf-8')
-                            
-                            logger.debug(f"📨 Raw line: {line.strip()}")
+                            logger.debug("📨 Raw line: %r", line)
                             
-                            # Parse the JSON response from Ollama
-                            data = json.loads(line)
+                            # Parse the JSON response from Ollama (bytes or str)
+                            data = json_codec.loads(line)
                             
                             # Extract content from Ollama's format
                             content = ""
@@ -247,36 +260,26 @@ ANSWER:
                             if content:
                                 chunk_count += 1
                                 full_response += content
-                                logger.info(f"📤 Streaming chunk {chunk_count}: '{content}'")
+                                logger.info("📤 Streaming chunk %s: '%s'", chunk_count, content)
                                 
                                 # Format as OpenAI streaming response
-                                chunk_data = {
-                                    'id': f'chatcmpl-{int(time.time())}',
-                                    'object': 'chat.completion.chunk',
-                                    'created': int(time.time()),
-                                    'model': model,
-                                    'choices': [{
-                                        'index': 0,
-                                        'delta': {'content': content},
-                                        'finish_reason': None
-                                    }]
-                                }
-                                yield f"data: {json.dumps(chunk_data)}\n\n"
+                                delta['content'] = content
+                                yield b"data: " + json_codec.dumps(chunk_data) + b"\n\n"
                                 
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"JSON decode error on line: {line}, error: {e}")
+                        except json_codec.JSONDecodeError as e:
+                            logger.warning("JSON decode error on line: %s, error: %s", line, e)
                             continue
                         except Exception as e:
-                            logger.warning(f"Error processing line: {e}")
+                            logger.warning("Error processing line: %s", e)
                             continue
                 
-                logger.info(f"✅ Stream completed. Sent {chunk_count} chunks. Full response: {full_response}")
+                logger.info("✅ Stream completed. Sent %s chunks. Full response: %s", chunk_count, full_response)
                 
                 # Send final done chunk
                 final_chunk = {
-                    'id': f'chatcmpl-{int(time.time())}',
+                    'id': chunk_id,
                     'object': 'chat.completion.chunk',
-                    'created': int(time.time()),
+                    'created': created,
                     'model': model,
                     'choices': [{
                         'index': 0,
@@ -284,18 +287,24 @@ ANSWER:
                         'finish_reason': 'stop'
                     }]
                 }
-                yield f"data: {json.dumps(final_chunk)}\n\n"
-                yield "data: [DONE]\n\n"
+                yield b"data: " + json_codec.dumps(final_chunk) + b"\n\n"
+                yield b"data: [DONE]\n\n"
                 
             except Exception as e:
-                logger.error(f"Streaming error: {e}")
+                logger.error("Streaming error: %s", e)
                 error_chunk = {
                     'error': str(e)
                 }
-                yield f"data: {json.dumps(error_chunk)}\n\n"
+                yield b"data: " + json_codec.dumps(error_chunk) + b"\n\n"
         
-        # Return the generator function directly - the Flask route will handle the Response creation
-        return generate()
+        return Response(
+            generate(),
+            mimetype='text/event-stream;charset=utf-8',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'                 # disable proxy buffering
+            }
+        )
                     
    
     
@@ -345,7 +354,7 @@ ANSWER:
             return response_data
             
         except Exception as e:
-            logger.error(f"Error formatting response: {str(e)}")
+            logger.error("Error formatting response: %s", e)
             return {"error": f"Error formatting response: {str(e)}"}
 
     def health_check(self):
@@ -5,6 +5,32 @@ from typing import List, Optional, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# Potential Latin words: typical Latin endings, or words known from the Psalms.
+# Both alternatives match whole words, so one compiled scan finds the union
+_LATIN_WORD_RE = re.compile(
+    r'\b[a-zA-Z]+(?:us|um|a|ae|is|it|at|et|nt|tur|ur|bit|vit|sit)\b'
+    r'|\b(?:abiit|stetit|sedit|meditabitur|lege|domini|beatus|vir|consilio)\b',
+    re.IGNORECASE
+)
+
+
+def _keyword_re(keywords):
+    """One alternation that finds any of the keywords as a substring"""
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+
+
+# Question keywords, matched against the lower-cased question in one scan each
+_AUGUSTINE_KEYWORDS_RE = _keyword_re([
+    'augustine', 'exposition', 'commentary', 'interpretation', 'explain', 
+    'analysis', 'st.', 'saint', 'church father'
+])
+_NO_PSALM_TEXT_KEYWORDS_RE = _keyword_re([
+    'method', 'approach', 'style', 'about augustine'
+])
+_WORD_ANALYSIS_KEYWORDS_RE = _keyword_re([
+    'word', 'analyze', 'meaning', 'definition', 'grammar'
+])
+
 class AugustineRetriever:
     """Intelligent retriever for Psalms and Augustine commentaries"""
     
@@ -88,33 +114,24 @@ class AugustineRetriever:
         
         return {
             'latin_words': self._extract_latin_words(question),
-            'needs_augustine': any(keyword in question_lower for keyword in [
-                'augustine', 'exposition', 'commentary', 'interpretation', 'explain', 
-                'analysis', 'st.', 'saint', 'church father'
-            ]),
-            'needs_psalm_text': not any(keyword in question_lower for keyword in [
-                'method', 'approach', 'style', 'about augustine'
-            ]),
-            'is_word_analysis': any(keyword in question_lower for keyword in [
-                'word', 'analyze', 'meaning', 'definition', 'grammar'
-            ])
+            'needs_augustine': _AUGUSTINE_KEYWORDS_RE.search(question_lower) is not None,
+            'needs_psalm_text': _NO_PSALM_TEXT_KEYWORDS_RE.search(question_lower) is None,
+            'is_word_analysis': _WORD_ANALYSIS_KEYWORDS_RE.search(question_lower) is not None
         }
     
     def _extract_latin_words(self, text: str) -> List[str]:
         """Extract potential Latin words from text"""
-        # Common Latin patterns: words with typical Latin endings
-        latin_patterns = [
-            r'\b[a-zA-Z]+(?:us|um|a|ae|is|it|at|et|nt|tur|ur|bit|vit|sit)\b',
-            r'\b(?:abiit|stetit|sedit|meditabitur|lege|domini|beatus|vir|consilio)\b'
-        ]
-        
-        words = []
-        for pattern in latin_patterns:
-            words.extend(re.findall(pattern, text, re.IGNORECASE))
+        words = _LATIN_WORD_RE.findall(text)
         
         # Remove duplicates and return lowercase
         return list(set([w.lower() for w in words]))
     
+    @staticmethod
+    def _contains_any(text: str, words: List[str]) -> bool:
+        """Whether any of the lower-case words occurs in text, lower-casing it once"""
+        text_lower = text.lower()
+        return any(word in text_lower for word in words)
+    
     def _get_psalm_context(self, psalm_number: int, verse_number: Optional[int], 
                           latin_words: List[str]) -> Optional[str]:
         """Get relevant Psalm verses"""
@@ -137,7 +154,7 @@ class AugustineRetriever:
                     verse_text += f"Grammar: {verse['grammatical_notes']}\n"
                 
                 # Highlight if this verse contains the Latin words we're looking for
-                if latin_words and any(word in verse['latin_text'].lower() for word in latin_words):
+                if latin_words and self._contains_any(verse['latin_text'], latin_words):
                     verse_text += "🔍 **Contains relevant Latin words**\n"
                 
                 context_parts.append(verse_text)
@@ -166,10 +183,13 @@ class AugustineRetriever:
             
             # Highlight if this commentary contains the Latin words we're looking for
             if latin_words:
+                # Lower-case the text and terms once, not once per word
+                latin_lower = comment['latin_text'].lower()
+                terms_lower = [term.lower() for term in comment.get('key_terms') or []]
                 contains_words = []
                 for word in latin_words:
-                    if (word in comment['latin_text'].lower() or 
-                        any(word in term.lower() for term in comment.get('key_terms', []))):
+                    if (word in latin_lower or 
+                        any(word in term for term in terms_lower)):
                         contains_words.append(word)
                 
                 if contains_words:
@@ -187,7 +207,7 @@ class AugustineRetriever:
         if psalm_number:
             for v in [1, 2]:  # Check first few verses
                 verse = self.cassandra_client.get_psalm_verse(psalm_number, "", v)
-                if verse and any(word in verse['latin_text'].lower() for word in latin_words):
+                if verse and self._contains_any(verse['latin_text'], latin_words):
                     context_parts.append(f"PSALM {psalm_number}:{v} contains relevant words")
                     context_parts.append(f"Latin: {verse['latin_text']}")
         
@@ -196,7 +216,7 @@ class AugustineRetriever:
             protestant_psalm = self.converter.to_protestant(psalm_number)
             comments = self.cassandra_client.get_augustine_comments(protestant_psalm, None)
             for comment in comments:
-                if any(word in comment['latin_text'].lower() for word in latin_words):
+                if self._contains_any(comment['latin_text'], latin_words):
                     context_parts.append(f"AUGUSTINE discusses these words in {comment['work_title']}")
                     context_parts.append(f"Excerpt: {comment['latin_text'][:100]}...")
         
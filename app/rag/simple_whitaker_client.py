@@ -1,11 +1,16 @@
 import logging
 import requests
 import json
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, List, Any
 import time
 
 logger = logging.getLogger(__name__)
 
+# Connection pool sizing for the keep-alive session shared by all calls
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
 class SimpleWhitakerClient:
     """
     Simple Whitaker client for interacting with the Whitaker service
@@ -15,6 +20,13 @@ class SimpleWhitakerClient:
         self.host = host
         self.port = port
         self.base_url = base_url or f"http://{host}:{port}"
+
+        # One pooled keep-alive session instead of a new connection per call;
+        # wait_for_service already handles retrying an unavailable service
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
         
         logger.info(f"Initializing Whitaker client for {self.base_url}")
         
@@ -26,10 +38,14 @@ class SimpleWhitakerClient:
             logger.error(f"❌ Failed to connect to Whitaker service: {e}")
             raise
     
+    def close(self) -> None:
+        """Release the pooled connections"""
+        self._session.close()
+    
     def health_check(self) -> str:
         """Check if Whitaker service is accessible"""
         try:
-            response = requests.get(f"{self.base_url}/health", timeout=10)
+            response = self._session.get(f"{self.base_url}/health", timeout=10)
             if response.status_code == 200:
                 return f"✅ Whitaker service is healthy: {response.text}"
             else:
@@ -46,7 +62,7 @@ class SimpleWhitakerClient:
         endpoint = f"{self.base_url}/analyze"
         
         try:
-            response = requests.post(
+            response = self._session.post(
                 endpoint,
                 json={"word": word, "language": language},
                 timeout=30
@@ -70,7 +86,7 @@ class SimpleWhitakerClient:
         endpoint = f"{self.base_url}/analyze/text"
         
         try:
-            response = requests.post(
+            response = self._session.post(
                 endpoint,
                 json={"text": text, "language": language},
                 timeout=60
@@ -94,7 +110,7 @@ class SimpleWhitakerClient:
         endpoint = f"{self.base_url}/dictionary/{word}"
         
         try:
-            response = requests.get(endpoint, timeout=30)
+            response = self._session.get(endpoint, timeout=30)
             
             if response.status_code == 200:
                 logger.info(f"✅ Retrieved dictionary entry for: {word}")
@@ -114,7 +130,7 @@ class SimpleWhitakerClient:
         endpoint = f"{self.base_url}/analyze/batch"
         
         try:
-            response = requests.post(
+            response = self._session.post(
                 endpoint,
                 json={"words": words, "language": language},
                 timeout=60
@@ -138,7 +154,7 @@ class SimpleWhitakerClient:
         endpoint = f"{self.base_url}/info"
         
         try:
-            response = requests.get(endpoint, timeout=10)
+            response = self._session.get(endpoint, timeout=10)
             
             if response.status_code == 200:
                 return response.json()
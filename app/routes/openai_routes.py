@@ -1,21 +1,37 @@
 # app/routes/openai_routes.py
-from flask import Blueprint, request, jsonify, current_app, Response
+from flask import Blueprint, jsonify, current_app, Response
 from app.processors.processor_router import ProcessorRouter
+from app.utils import json_codec
+from app.utils.pattern_detector import create_pattern_detector
+from app.utils.stream_buffer import coalesce, gzip_if_accepted
 import time
 import logging
 import requests
 import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List
 
 openai_bp = Blueprint('openai', __name__)
 logger = logging.getLogger(__name__)
 
+# Request fields that carry tooling metadata; their presence means the request
+# is forwarded to the provider untouched instead of going through pattern detection
+PASSTHROUGH_KEYS = frozenset(('tools', 'functions', 'tool_choice', 'response_format', 'stream_options'))
 
-def _handle_passthrough_request(data, messages, model, stream):
+# Processor header looked for in earlier conversation turns
+_PROCESSOR_MARKER = re.compile(r'### processor:', re.IGNORECASE)
+
+def _processor_router() -> ProcessorRouter:
+    """Return the current app's router from its config (KeyError if missing)"""
+    return current_app.config['processor_router']
+
+
+def _handle_passthrough_request(data: Dict[str, Any], messages: List[Any], model: str, stream: bool):
     """
     Handle OpenAI-compatible passthrough requests with tooling metadata
     """
     try:
-        processor_router = current_app.config['processor_router']
+        processor_router = _processor_router()
         ai_provider = getattr(processor_router, "ai_provider", None)
         
         if ai_provider is None:
@@ -34,18 +50,18 @@ def _handle_passthrough_request(data, messages, model, stream):
     }
     
     # Add optional fields if present
-    optional_keys = ['tools', 'functions', 'tool_choice', 'response_format', 'stream_options']
-    for key in optional_keys:
-        if key in data and data[key]:
+    for key in PASSTHROUGH_KEYS & data.keys():
+        if data[key]:
             forward_options[key] = data[key]
 
-    # Log request sent to llamacpp
-    request_payload = {
-        "model": model,
-        "messages": messages,
-        **forward_options
-    }
-    logger.info("### Sending to llamacpp:\n%s", json.dumps(request_payload, indent=2, ensure_ascii=False))
+    # Log request sent to llamacpp (the pretty-printed dump is only built when DEBUG is on)
+    if logger.isEnabledFor(logging.DEBUG):
+        request_payload = {
+            "model": model,
+            "messages": messages,
+            **forward_options
+        }
+        logger.debug("### Sending to llamacpp:\n%s", json.dumps(request_payload, indent=2, ensure_ascii=False))
 
     try:
         response = ai_provider.generate_openai_compatible(
@@ -79,62 +95,81 @@ def _handle_passthrough_request(data, messages, model, stream):
         return jsonify({"error": f"Failed to forward request: {str(exc)}"}), 500
     
 
-def _handle_passthrough_streaming(response, model):
+def _may_need_latin1_repair(payload: bytes) -> bool:
+    """
+    Cheap pre-check for the latin-1 repair in the passthrough stream.
+
+    Mojibake shows up either as raw non-ASCII characters or as ``\\u00XX``
+    escapes; a pure-ASCII payload without such escapes is left unchanged by
+    the repair, so it can be forwarded without a JSON round-trip.
+    """
+    return not payload.isascii() or b'\\u00' in payload
+
+
+def _repair_latin1(text: Any) -> Any:
+    """
+    Undo UTF-8 text that was mis-decoded as latin-1 upstream.
+
+    ASCII (and non-string) content is returned untouched, so only fields that
+    actually carry high-bit characters pay for the encode/decode round-trip.
+    """
+    if not isinstance(text, str) or text.isascii():
+        return text
+    return text.encode('latin1').decode('utf-8', errors='replace')
+
+
+def _handle_passthrough_streaming(response: Iterable[Any], model: str) -> Response:
     """
     Handle streaming responses from any AI provider.
 
     The Ollama and LlamaCPP providers both return an iterator of lines
     (bytes or str).  Some future providers may yield JSON objects directly.
     This implementation normalises the output to the OpenAI SSE format
-    while preserving UTF‑8 correctness.
+    while preserving UTF‑8 correctness.  Lines are handled as bytes end to
+    end; only payloads that need the latin‑1 repair are decoded.
     """
     logger.info("### Receiving streaming response from llamacpp")
 
-    def generate():
+    def generate() -> Iterator[bytes]:
         for raw in response:
-            # Normalise bytes to str
-            if isinstance(raw, bytes):
-                raw = raw.decode('utf-8', errors='replace')
+            # Normalise str to bytes
+            if isinstance(raw, str):
+                raw = raw.encode('utf-8')
             # Normalise dicts to JSON lines (some providers may yield dicts)
             elif isinstance(raw, dict):
-                raw = json.dumps(raw, ensure_ascii=False)
+                raw = json_codec.dumps(raw)
+
+            # Blank separators, comments/keep-alives, [DONE] and ASCII-only
+            # data frames are forwarded as-is; each chunk ends with a newline
+            # as required by SSE
+            if not raw.startswith(b"data: ") or not _may_need_latin1_repair(raw):
+                yield raw + b"\n"
+                continue
 
             # LlamaCPP streams lines prefixed with "data: "
-            if isinstance(raw, str) and raw.startswith("data: "):
-                payload = raw[6:].strip()
-                if payload and payload != "[DONE]":
-                    try:
-                        data = json.loads(payload)          # parse JSON payload
-                        # Fix known latin‑1 encoding issue from LlamaCPP
-                        for c in data.get("choices", []):
-                            if "delta" in c and "content" in c["delta"]:
-                                c["delta"]["content"] = (
-                                    c["delta"]["content"]
-                                    .encode('latin1')
-                                    .decode('utf-8', errors='replace')
-                                )
-                            if "message" in c and "content" in c["message"]:
-                                c["message"]["content"] = (
-                                    c["message"]["content"]
-                                    .encode('latin1')
-                                    .decode('utf-8', errors='replace')
-                                )
-                        raw = "data: " + json.dumps(data, ensure_ascii=False)
-                    except Exception:
-                        # If parsing fails, keep the original line
-                        pass
-            # Ensure each chunk ends with a newline as required by SSE
-            yield raw + "\n"
-
-    # Return a Flask streaming response with proper SSE MIME type
-    return current_app.response_class(
-        generate(),
+            try:
+                data = json_codec.loads(raw[6:])    # parse JSON payload
+                # Fix known latin‑1 encoding issue from LlamaCPP
+                for c in data.get("choices", []):
+                    if "delta" in c and "content" in c["delta"]:
+                        c["delta"]["content"] = _repair_latin1(c["delta"]["content"])
+                    if "message" in c and "content" in c["message"]:
+                        c["message"]["content"] = _repair_latin1(c["message"]["content"])
+                yield b"data: " + json_codec.dumps(data) + b"\n"
+            except Exception:
+                # If parsing fails, keep the original line
+                yield raw + b"\n"
+
+    # Return a Flask streaming response with proper SSE MIME type; batches
+    # are gzipped for clients that ask for it
+    return gzip_if_accepted(current_app.response_class(
+        coalesce(generate()),
         mimetype="text/event-stream; charset=utf-8"
-    )
+    ))
 
 
 
-def _handle_passthrough_non_streaming(response, model):
+def _handle_passthrough_non_streaming(response: Any, model: str):
     """
     Handle non-streaming passthrough response with proper UTF-8 encoding
     """
@@ -143,34 +178,23 @@ def _handle_passthrough_non_streaming(response, model):
         return jsonify({"error": "Unexpected response format from AI provider"}), 500
 
     # Log response received from llamacpp
-    logger.info("### Received from llamacpp:\n%s", json.dumps(response, indent=2, ensure_ascii=False))
-    
-    # Ensure UTF-8 encoding
-    json_str = json.dumps(response, ensure_ascii=False)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("### Received from llamacpp:\n%s", json.dumps(response, indent=2, ensure_ascii=False))
     
-    return Response(
-        json_str,
-        mimetype='application/json; charset=utf-8',
-        headers={'Content-Type': 'application/json; charset=utf-8'}
-    )
+    # Serialise straight to UTF-8 bytes (non-ASCII characters are kept as-is)
+    return Response(json_codec.dumps(response), mimetype='application/json; charset=utf-8')
 
 
-def _should_passthrough(data, messages):
+def _should_passthrough(data: Dict[str, Any], messages: List[Any]) -> bool:
     """
     Determine if request should bypass pattern detection
     """
-    passthrough_keys = ('tools', 'functions', 'tool_choice', 'response_format', 'stream_options')
-    
     # Check for tooling metadata in request data
-    if any(key in data and data[key] for key in passthrough_keys):
+    if any(data[key] for key in PASSTHROUGH_KEYS & data.keys()):
         return True
-    
+
     # Check for tool_calls in messages
-    for message in messages:
-        if isinstance(message, dict) and message.get('tool_calls'):
-            return True
-    
-    return False
+    return any(isinstance(message, dict) and message.get('tool_calls') for message in messages)
 
 
 @openai_bp.route('/v1/chat/completions', methods=['POST'])
@@ -178,7 +202,10 @@ def chat_completions():
     """
     OpenAI-compatible endpoint that uses pattern detection
     """
-    data = request.json or {}
+    try:
+        data = json_codec.json_body()
+    except json_codec.JSONDecodeError:
+        return jsonify({"error": "Invalid JSON body"}), 400
     messages = data.get('messages', [])
     model = data.get('model', 'deepseek-coder:6.7b')
     stream = data.get('stream', False)
@@ -188,11 +215,12 @@ def chat_completions():
         return _handle_passthrough_request(data, messages, model, stream)
 
     # PATTERN DETECTION PATH (your existing code)
-    # Get the last user message
+    # Get the last user message (usually the final entry, so scan from the end)
     user_message = ""
-    for message in reversed(messages):
-        if message.get('role') == 'user':
-            user_message = message.get('content', '')
+    user_index = -1
+    for user_index in range(len(messages) - 1, -1, -1):
+        if messages[user_index].get('role') == 'user':
+            user_message = messages[user_index].get('content', '')
             break
 
     if not user_message:
@@ -204,20 +232,23 @@ def chat_completions():
     elif not isinstance(user_message, str):
         user_message = str(user_message)
 
-    from app.utils.pattern_detector import PatternDetector
-    pattern_detector = PatternDetector()
+    pattern_detector = create_pattern_detector()
     pattern_data = pattern_detector.detect_pattern(user_message)
     
-    # Handle conversation history for processor specification
+    # Handle conversation history for processor specification.
+    # The last user message was detected above, so it is not parsed again.
     if not pattern_data or not pattern_data.get('processor'):
-        for message in messages:
+        for index, message in enumerate(messages):
+            if index == user_index:
+                continue
             content = message.get('content', '')
             if isinstance(content, list):
                 content = ' '.join(str(item) for item in content)
             elif not isinstance(content, str):
                 content = str(content)
 
-            if '### processor:' in content.lower():
+            # '###' is a cheap case-free precheck; most turns have no header at all
+            if '###' in content and _PROCESSOR_MARKER.search(content):
                 historical_pattern_data = pattern_detector.detect_pattern(content)
                 if historical_pattern_data and historical_pattern_data.get('processor'):
                     if not pattern_data:
@@ -238,21 +269,21 @@ def chat_completions():
     if pattern_data and isinstance(pattern_data, dict) and 'processor' in pattern_data:
         pass  # Already correct format
     elif pattern_data and isinstance(pattern_data, dict):
+        # No 'processor' key here, so the detected fields can be wrapped as-is
         pattern_data = {
-            'processor': pattern_data.get('processor'),
-            'pattern_data': {k: v for k, v in pattern_data.items() if k != 'processor'},
-            'specified_processor': bool(pattern_data.get('processor'))
+            'processor': None,
+            'pattern_data': pattern_data,
+            'specified_processor': False
         }
     else:
         pattern_data = {'pattern': 'custom', 'prompt': user_message}
 
     try:
-        processor_router = current_app.config['processor_router']
-        return processor_router.route_request(pattern_data, model, stream, data)
+        return _processor_router().route_request(pattern_data, model, stream, data)
     except KeyError:
         return jsonify({"error": "Processor router not initialized"}), 500
     except Exception as e:
-        logger.error(f"### PATTERN: Error in chat_completions: {str(e)}")
+        logger.error("### PATTERN: Error in chat_completions: %s", e)
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 
@@ -261,7 +292,7 @@ def list_models():
     """
     OpenAI-compatible models endpoint
     """
-    processor_router = current_app.config['processor_router']
+    processor_router = _processor_router()
 
     try: 
         default_model = processor_router.get_default_model()
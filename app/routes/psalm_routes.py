@@ -1,5 +1,6 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, jsonify, current_app
 from app.processors.psalm_rag_processor import PsalmRAGProcessor
+from app.utils.json_codec import JSONDecodeError, json_body
 
 # Create blueprint
 psalm_bp = Blueprint('psalm', __name__)
@@ -7,11 +8,44 @@ psalm_bp = Blueprint('psalm', __name__)
 # Get the psalm processor instance
 def get_psalm_processor():
     """Get the initialized PsalmRAGProcessor instance from current app context"""
-    if not hasattr(current_app, 'config') or 'processor_router' not in current_app.config:
-        # This might happen during app initialization
-        # In production, this should be initialized in create_app()
-        raise RuntimeError("Processor router not initialized in app context")
-    return current_app.config['processor_router'].processors['psalm_processor']
+    try:
+        # Stored by create_app() once the processor router is built
+        return current_app.config['psalm_processor']
+    except KeyError:
+        raise RuntimeError("Psalm processor not initialized in app context") from None
+
+def _json_response(result):
+    """Turn a processor result (dict or ``(dict, status)`` tuple) into a JSON response"""
+    if isinstance(result, tuple) and len(result) == 2:
+        payload, status_code = result
+        return jsonify(payload), status_code
+    return jsonify(result)
+
+def _dispatch_psalm(pattern, extra_fields, data):
+    """
+    Build the psalm_rag_processor payload for ``pattern`` from the request
+    body, run the processor and return the streaming or JSON response.
+    """
+    stream = data.get('stream', False)
+    model = data.get('model')
+    payload = {
+        "pattern": pattern,
+        **extra_fields,
+        "verse_number": data.get('verse_number'),
+        "question": data.get('question', ''),
+        "model": model,
+        "stream": stream,
+        "temperature": data.get('temperature', 0.1),
+        "max_tokens": data.get('max_tokens', 2000)
+    }
+
+    result = get_psalm_processor().process(payload, model, stream, data)
+
+    # Streaming results arrive as a ready-made SSE Response
+    if isinstance(result, Response):
+        return result
+
+    return _json_response(result)
 
 @psalm_bp.route('/api/query_psalm', methods=['POST'])
 def query_psalm():
@@ -27,47 +61,20 @@ def query_psalm():
     }
     """
     try:
-        data = request.get_json()
+        data = json_body()
         
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
         
-        # Extract parameters
         psalm_number = data.get('psalm_number')
         
         if not psalm_number:
             return jsonify({"error": "psalm_number is required"}), 400
         
-        # Create payload for psalm_rag_processor
-        payload = {
-            "pattern": "augustine_psalm_query",
-            "psalm_number": psalm_number,
-            "verse_number": data.get('verse_number'),
-            "question": data.get('question', ''),
-            "model": data.get('model'),
-            "stream": data.get('stream', False),
-            "temperature": data.get('temperature', 0.1),
-            "max_tokens": data.get('max_tokens', 2000)
-        }
-        
-        # Get the processor instance
-        psalm_processor = get_psalm_processor()
-        
-        # Call processor and handle response
-        result = psalm_processor.process(payload, payload.get('model'), payload.get('stream'), data)
-        
-        # Handle streaming response
-        if payload.get('stream', False) and hasattr(result, '__iter__') and not isinstance(result, (str, dict, list)):
-            # Return the generator directly for streaming
-            return result
-            
-        # Handle regular response
-        if isinstance(result, tuple) and len(result) == 2:
-            payload, status_code = result
-            return jsonify(payload), status_code
-        else:
-            return jsonify(result)
+        return _dispatch_psalm("augustine_psalm_query", {"psalm_number": psalm_number}, data)
         
+    except JSONDecodeError:
+        return jsonify({"error": "Invalid JSON body"}), 400
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
@@ -86,49 +93,25 @@ def analyze_psalm_word():
     }
     """
     try:
-        data = request.get_json()
+        data = json_body()
         
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
         
-        # Extract parameters
         word_form = data.get('word_form')
         psalm_number = data.get('psalm_number')
         
         if not word_form or not psalm_number:
             return jsonify({"error": "word_form and psalm_number are required"}), 400
         
-        # Create payload for psalm_rag_processor
-        payload = {
-            "pattern": "psalm_word_analysis",
-            "word_form": word_form,
-            "psalm_number": psalm_number,
-            "verse_number": data.get('verse_number'),
-            "question": data.get('question', ''),
-            "model": data.get('model'),
-            "stream": data.get('stream', False),
-            "temperature": data.get('temperature', 0.1),
-            "max_tokens": data.get('max_tokens', 2000)
-        }
-        
-        # Get the processor instance
-        psalm_processor = get_psalm_processor()
-        
-        # Call processor and handle response
-        result = psalm_processor.process(payload, payload.get('model'), payload.get('stream'), data)
-        
-        # Handle streaming response
-        if payload.get('stream', False) and hasattr(result, '__iter__') and not isinstance(result, (str, dict, list)):
-            # Return the generator directly for streaming
-            return result
-            
-        # Handle regular response
-        if isinstance(result, tuple) and len(result) == 2:
-            payload, status_code = result
-            return jsonify(payload), status_code
-        else:
-            return jsonify(result)
+        return _dispatch_psalm(
+            "psalm_word_analysis",
+            {"word_form": word_form, "psalm_number": psalm_number},
+            data
+        )
         
+    except JSONDecodeError:
+        return jsonify({"error": "Invalid JSON body"}), 400
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
@@ -137,14 +120,7 @@ def psalm_health():
     """Health check for Psalm RAG system"""
     try:
         psalm_processor = get_psalm_processor()
-        result = psalm_processor.health_check()
-        
-        # Handle regular response
-        if isinstance(result, tuple) and len(result) == 2:
-            payload, status_code = result
-            return jsonify(payload), status_code
-        else:
-            return jsonify(result)
+        return _json_response(psalm_processor.health_check())
             
     except Exception as e:
         return jsonify({"error": f"Health check failed: {str(e)}"}), 500
@@ -1,12 +1,137 @@
 # app/utils/ai_provider.py
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+import asyncio
+import copy
+import functools
+import hashlib
+import threading
 import requests
 import json
 import logging
 import time
-from typing import Dict, Any, Generator
+from typing import Dict, Any, Generator, Iterator, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.utils import json_codec
 logger = logging.getLogger(__name__)
+
+# Connection pool sizing for upstream provider calls
+POOL_CONNECTIONS = 32
+POOL_MAXSIZE = 64
+
+# Transient upstream statuses that are worth re-sending after a backoff.
+# A plain 500 is left out: it usually means the request itself is at fault.
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+# Longest Retry-After (seconds) a request thread will sleep for; the workers are
+# synchronous, so an upstream asking for minutes must not hold one that long
+RETRY_AFTER_MAX = 5.0
+
+JSON_HEADERS = {"Content-Type": "application/json; charset=utf-8"}
+
+# Transcript prefixes used when a chat is flattened for Ollama's /api/generate;
+# messages with any other role (e.g. tool) are left out
+_ROLE_PREFIX = {"system": "System: ", "user": "User: ", "assistant": "Assistant: "}
+
+# Optional request fields forwarded to the upstream API when supplied in kwargs
+OPENAI_OPTIONAL_KEYS = frozenset((
+    "tools", "functions", "tool_choice", "response_format", "logit_bias", "user",
+    "stop", "n", "presence_penalty", "frequency_penalty", "stream_options", "seed"
+))
+LLAMACPP_OPTIONAL_PARAMS = frozenset((
+    "top_k", "repeat_penalty", "min_p", "presence_penalty", "frequency_penalty", "stop"
+))
+# The subset of OPENAI_OPTIONAL_KEYS that /completions accepts; "n" is left out
+# because extra choices would break the one-text-per-prompt mapping
+OPENAI_COMPLETIONS_KEYS = frozenset((
+    "logit_bias", "user", "stop", "presence_penalty", "frequency_penalty", "seed"
+))
+
+def _content_text(content: Any) -> str:
+    """
+    Plain text of a chat message's content for a flattened transcript.
+    OpenAI multi-part content (a list of parts) contributes its text parts;
+    image and other non-text parts are dropped.
+    """
+    if isinstance(content, str):
+        return content
+    if content is None:
+        return ''
+    if isinstance(content, list):
+        return "\n".join(
+            (part.get('text') or '') if isinstance(part, dict) else str(part)
+            for part in content
+            if not isinstance(part, dict) or part.get('type', 'text') == 'text'
+        )
+    return str(content)
+
+class _CappedRetry(Retry):
+    """``Retry`` that honours ``Retry-After`` only up to ``RETRY_AFTER_MAX``."""
+
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, RETRY_AFTER_MAX)
+
+def create_session(headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """
+    Create a keep-alive session with a pooled adapter for provider calls.
+    Connection failures and the transient RETRY_STATUSES (rate limiting,
+    overloaded gateways) are retried with exponential backoff, honouring
+    ``Retry-After`` up to ``RETRY_AFTER_MAX``; a request whose response was
+    being read is never re-sent. Once retries run out the last response is
+    returned, so ``raise_for_status`` still reports it. ``headers`` are sent
+    with every request.
+    """
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=_CappedRetry(
+            total=5,
+            connect=3,
+            read=0,
+            status=3,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(("POST",)),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 class AIProvider(ABC):
+    # Concrete providers declare their attributes in __slots__; the base adds none
+    __slots__ = ()
+
+    # Each provider keeps its own pooled session so TCP/TLS connections are
+    # reused across requests and the fixed headers are set only once; this
+    # replaces the caller-supplied session= override the calls used to take
+    _session: requests.Session
+
+    def close(self) -> None:
+        """Release the pooled connections held by this provider."""
+        self._session.close()
+
+    def _post(self, url: str, payload: Dict[str, Any], stream: bool) -> requests.Response:
+        """POST ``payload`` as pre-encoded UTF-8 JSON through the pooled session."""
+        return self._session.post(url, data=json_codec.dumps(payload),
+                                  timeout=self.timeout, stream=stream)
+
+    @staticmethod
+    def _read(response: requests.Response, stream: bool) -> Any:
+        """
+        Return the line iterator for a stream, otherwise the decoded JSON body.
+        Streamed lines are raw UTF-8 ``bytes``; consumers parse them directly.
+        """
+        if stream:
+            return response.iter_lines()
+        return json_codec.loads(response.content)
+
     @abstractmethod
     def generate(self, prompt: str, model: str, stream: bool = False, **kwargs) -> Any:
         """Generate a response. Returns a dict when stream=False, otherwise an iterator."""
@@ -14,313 +139,416 @@ class AIProvider(ABC):
     
     @abstractmethod
     def generate_openai_compatible(self, messages: list, model: str, stream: bool = False, **kwargs) -> Any:
-        """Generate a response compatible with OpenAI API. Returns a dict when stream=False, otherwise an iterator."""
+        """
+        Generate a response compatible with OpenAI API. Returns a dict when stream=False, otherwise an iterator.
+        """
         pass
 
+    def generate_stream(self, messages: list, model: str, **kwargs) -> Iterator[str]:
+        """
+        Stream a chat completion and yield the text pieces as they arrive.
+        ``"".join(...)`` gives the full answer, but the first piece is
+        available after the first token instead of after the last one.
+        """
+        for line in self.generate_openai_compatible(messages, model, stream=True, **kwargs):
+            text = stream_chunk_text(line)
+            if text:
+                yield text
+
+    def generate_batch(self, prompts: List[str], model: str, concurrency: int = 8, **kwargs) -> List[Any]:
+        """
+        Complete every prompt and return one completion text per prompt, in
+        order; a failed prompt yields its exception in place. By default the
+        prompts are sent as concurrent single requests (see ``batch_generate``);
+        providers whose server accepts a prompt list override this with one
+        request, so ``concurrency`` does not apply there and a failed request
+        puts its exception in every slot. Intended for synchronous callers -
+        it runs its own event loop, so asyncio code must await
+        ``batch_generate`` instead.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("generate_batch() cannot run inside an event loop; "
+                               "use 'await batch_generate(...)' instead")
+        results = asyncio.run(batch_generate(self, prompts, model, concurrency, **kwargs))
+        return [r if isinstance(r, Exception) else completion_text(r) for r in results]
+
+    def _completions_batch(self, url: str, prompts: List[str], model: str,
+                           optional_keys: frozenset, **kwargs) -> List[Any]:
+        """
+        Send all prompts in one OpenAI-style /completions request. If that
+        request fails, its exception is returned in place of every prompt.
+        """
+        payload = {
+            "model": model,
+            "prompt": prompts,
+            "temperature": kwargs.get('temperature', 0.1),
+            "max_tokens": kwargs.get('max_tokens', 4096),
+            "top_p": kwargs.get('top_p', 0.9)
+        }
+        _add_optional_keys(payload, kwargs, optional_keys)
+        try:
+            response = self._post(url, payload, False)
+            response.raise_for_status()
+            choices = json_codec.loads(response.content).get("choices", [])
+        except Exception as exc:
+            return [exc] * len(prompts)
+        # Choices carry the index of the prompt they answer
+        return [choice.get("text", "") for choice in sorted(choices, key=lambda c: c.get("index", 0))]
+
+    async def agenerate(self, prompt: str, model: str, **kwargs) -> Any:
+        """
+        Non-streaming ``generate`` for asyncio callers. The blocking HTTP call
+        runs in a worker thread, so concurrent calls share the pooled session.
+        """
+        return await asyncio.to_thread(self.generate, prompt, model, False, **kwargs)
+
+    async def agenerate_openai_compatible(self, messages: list, model: str, **kwargs) -> Any:
+        """Non-streaming ``generate_openai_compatible`` for asyncio callers."""
+        return await asyncio.to_thread(self.generate_openai_compatible, messages, model, False, **kwargs)
+
+def _build_openai_payload(messages: list, model: str, stream: bool, kwargs: Dict[str, Any],
+                          optional_keys: frozenset) -> Dict[str, Any]:
+    """
+    Chat-completions payload shared by the OpenAI-compatible providers; the
+    ``optional_keys`` supplied in ``kwargs`` with a value are passed through.
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": stream,
+        "temperature": kwargs.get('temperature', 0.1),
+        "max_tokens": kwargs.get('max_tokens', 4096),
+        "top_p": kwargs.get('top_p', 0.9)
+    }
+    _add_optional_keys(payload, kwargs, optional_keys)
+    return payload
+
+def _add_optional_keys(payload: Dict[str, Any], kwargs: Dict[str, Any], optional_keys: frozenset) -> None:
+    """Copy the ``optional_keys`` supplied in ``kwargs`` with a value into ``payload``."""
+    for key in optional_keys & kwargs.keys():
+        value = kwargs[key]
+        if value is not None:
+            payload[key] = value
+
+def completion_text(result: Dict[str, Any]) -> str:
+    """Extract the generated text from an OpenAI, Ollama chat or Ollama generate response."""
+    if "choices" in result:
+        choice = result["choices"][0] if result["choices"] else {}
+        return choice.get("text") or choice.get("message", {}).get("content", "")
+    if "message" in result:
+        return result["message"].get("content", "")
+    return result.get("response", "")
+
+def stream_chunk_text(line: Any) -> Optional[str]:
+    """
+    Text carried by one streamed line: an OpenAI SSE ``data:`` frame or an
+    Ollama NDJSON line, as bytes or str. Returns None for keep-alives, the
+    ``[DONE]`` sentinel and anything that is not JSON.
+    """
+    if isinstance(line, str):
+        line = line.encode('utf-8')
+    line = line.strip()
+    if line.startswith(b"data:"):
+        line = line[5:].lstrip()
+    if not line or line == b"[DONE]" or line[:1] != b"{":
+        return None
+    try:
+        data = json_codec.loads(line)
+    except json_codec.JSONDecodeError:
+        return None
+    if "choices" in data:
+        choice = data["choices"][0] if data["choices"] else {}
+        return (choice.get("delta") or {}).get("content")
+    if "message" in data:
+        return data["message"].get("content")
+    return data.get("response")
+
+async def batch_generate(provider: AIProvider, prompts: List[str], model: str,
+                         concurrency: int = 8, **kwargs) -> List[Any]:
+    """
+    Run ``provider.agenerate`` for every prompt with at most ``concurrency``
+    requests in flight. Results are returned in prompt order; a failed
+    prompt yields its exception instead of cancelling the whole batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(prompt: str) -> Any:
+        async with semaphore:
+            return await provider.agenerate(prompt, model, **kwargs)
+
+    return await asyncio.gather(*(run(prompt) for prompt in prompts), return_exceptions=True)
+
 class OllamaProvider(AIProvider):
+    __slots__ = ("base_url", "timeout", "_session", "_chat_supported")
+
     def __init__(self, base_url: str, timeout: float):
         self.base_url = base_url
         self.timeout = timeout
+        self._session = create_session(JSON_HEADERS)
+        # Whether the server has /api/chat: None until the first call settles it
+        self._chat_supported: Optional[bool] = None
+
+    @staticmethod
+    def _options(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "temperature": kwargs.get('temperature', 0.1),
+            "top_p": kwargs.get('top_p', 0.9),
+            "top_k": kwargs.get('top_k', 40),
+            "num_predict": kwargs.get('max_tokens', 4096)
+        }
 
     def generate(self, prompt: str, model: str, stream: bool = False, **kwargs) -> Any:
         payload = {
             "model": model,
             "prompt": prompt,
             "stream": stream,
-            "options": {
-                "temperature": kwargs.get('temperature', 0.1),
-                "top_p": kwargs.get('top_p', 0.9),
-                "top_k": kwargs.get('top_k', 40),
-                "num_predict": kwargs.get('max_tokens', 4096)
-            }
+            "options": self._options(kwargs)
         }
         
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-        response = requests.post(
-            f"{self.base_url}/api/generate",
-            json=payload,
-            headers=headers,
-            timeout=self.timeout,
-            stream=stream
-        )
+        response = self._post(f"{self.base_url}/api/generate", payload, stream)
         response.raise_for_status()
         
-        if stream:
-            return response.iter_lines(decode_unicode=True)
-        else:
-            return response.json()
+        return self._read(response, stream)
 
     def generate_openai_compatible(self, messages: list, model: str, stream: bool = False, **kwargs) -> Any:
         # Try Ollama's /api/chat endpoint first (newer versions)
         # If it fails with 404, fall back to /api/generate (older versions)
+        if self._chat_supported is False:
+            return self._generate_from_messages(messages, model, stream, kwargs)
+
         payload_chat = {
             "model": model,
             "messages": messages,
             "stream": stream,
-            "options": {
-                "temperature": kwargs.get('temperature', 0.1),
-                "top_p": kwargs.get('top_p', 0.9),
-                "top_k": kwargs.get('top_k', 40),
-                "num_predict": kwargs.get('max_tokens', 4096)
-            }
+            "options": self._options(kwargs)
         }
         
         try:
-            headers = {"Content-Type": "application/json; charset=utf-8"}
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload_chat,
-                headers=headers,
-                timeout=self.timeout,
-                stream=stream
-            )
+            response = self._post(f"{self.base_url}/api/chat", payload_chat, stream)
             response.raise_for_status()
+            self._chat_supported = True
             
-            if stream:
-                return response.iter_lines(decode_unicode=True)
-            else:
-                return response.json()
+            return self._read(response, stream)
         except requests.exceptions.HTTPError as e:
             # If /api/chat returns 404 (not available in this Ollama version), fall back to /api/generate
-            import logging
-            logger = logging.getLogger(__name__)
-            
-            if hasattr(e, 'response') and e.response.status_code == 404:
-                logger.warning(f"Ollama /api/chat endpoint returned 404, falling back to /api/generate. This suggests an older Ollama version or misconfiguration.")
-                # Convert messages to prompt format for /api/generate
-                conversation = []
-                for msg in messages:
-                    role = msg.get('role', 'user')
-                    content = msg.get('content', '')
-                    if role == 'system':
-                        conversation.append(f"System: {content}")
-                    elif role == 'user':
-                        conversation.append(f"User: {content}")
-                    elif role == 'assistant':
-                        conversation.append(f"Assistant: {content}")
-                
-                prompt = "\n".join(conversation) + "\nAssistant: "
-                
-                payload_generate = {
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": stream,
-                    "options": {
-                        "temperature": kwargs.get('temperature', 0.1),
-                        "top_p": kwargs.get('top_p', 0.9),
-                        "top_k": kwargs.get('top_k', 40),
-                        "num_predict": kwargs.get('max_tokens', 4096)
-                    }
-                }
-                
-                response = requests.post(
-                    f"{self.base_url}/api/generate",
-                    json=payload_generate,
-                    timeout=self.timeout,
-                    stream=stream
-                )
-                response.raise_for_status()
-                
-                if stream:
-                    return response.iter_lines(decode_unicode=True)
-                else:
-                    return response.json()
+            if hasattr(e, 'response') and e.response.status_code == 404 and not self._chat_supported:
+                logger.warning("Ollama /api/chat endpoint returned 404, falling back to /api/generate. This suggests an older Ollama version or misconfiguration.")
+                result = self._generate_from_messages(messages, model, stream, kwargs)
+                # Only remember the fallback once /api/generate has worked: a 404 for
+                # an unknown model would fail there too and must not stick
+                self._chat_supported = False
+                return result
             else:
                 # Not a 404 error, re-raise
-                logger.error(f"Ollama /api/chat endpoint error: {e.response.status_code if hasattr(e, 'response') else 'unknown'} - {str(e)}")
+                logger.error("Ollama /api/chat endpoint error: %s - %s",
+                             e.response.status_code if hasattr(e, 'response') else 'unknown', e)
                 raise
 
+    def _generate_from_messages(self, messages: list, model: str, stream: bool,
+                                kwargs: Dict[str, Any]) -> Any:
+        """Flatten the chat into a single prompt for servers without /api/chat."""
+        conversation = [
+            _ROLE_PREFIX[msg.get('role', 'user')] + _content_text(msg.get('content'))
+            for msg in messages
+            if msg.get('role', 'user') in _ROLE_PREFIX
+        ]
+        prompt = "\n".join(conversation) + "\nAssistant: "
+        
+        payload_generate = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": self._options(kwargs)
+        }
+        
+        response = self._post(f"{self.base_url}/api/generate", payload_generate, stream)
+        response.raise_for_status()
+        
+        return self._read(response, stream)
+
 class OpenAIProvider(AIProvider):
+    __slots__ = ("base_url", "api_key", "timeout", "_session")
+
     def __init__(self, base_url: str, api_key: str, timeout: float):
         self.base_url = base_url
         self.api_key = api_key
         self.timeout = timeout
+        self._session = create_session({**JSON_HEADERS, "Authorization": f"Bearer {api_key}"})
 
     def generate(self, prompt: str, model: str, stream: bool = False, **kwargs) -> Any:
         # For OpenAI, we use the chat completion endpoint
         messages = [{"role": "user", "content": prompt}]
         return self.generate_openai_compatible(messages, model, stream, **kwargs)
 
+    def generate_batch(self, prompts: List[str], model: str, concurrency: int = 8, **kwargs) -> List[Any]:
+        # The Completions API takes a list of prompts in a single request
+        return self._completions_batch(f"{self.base_url}/completions", prompts, model,
+                                       OPENAI_COMPLETIONS_KEYS, **kwargs)
+
     def generate_openai_compatible(self, messages: list, model: str, stream: bool = False, **kwargs) -> Any:
-        headers = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        payload = _build_openai_payload(messages, model, stream, kwargs, OPENAI_OPTIONAL_KEYS)
+        logger.debug("%s request payload: %s", type(self).__name__, payload)
         
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": stream,
-            "temperature": kwargs.get('temperature', 0.1),
-            "max_tokens": kwargs.get('max_tokens', 4096),
-            "top_p": kwargs.get('top_p', 0.9)
-        }
-        logger.debug("LlamaCppProvider request payload: %s", payload)
-
-        optional_keys = [
-            "tools",
-            "functions",
-            "tool_choice",
-            "response_format",
-            "logit_bias",
-            "user",
-            "stop",
-            "n",
-            "presence_penalty",
-            "frequency_penalty",
-            "stream_options",
-            "seed"
-        ]
-        for key in optional_keys:
-            value = kwargs.get(key)
-            if value is not None:
-                payload[key] = value
-        
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=self.timeout,
-            stream=stream
-        )
+        response = self._post(f"{self.base_url}/chat/completions", payload, stream)
         response.raise_for_status()
         
-        if stream:
-            return response.iter_lines(decode_unicode=True)
-        else:
-            return response.json()
+        return self._read(response, stream)
 
 class MistralProvider(AIProvider):
+    __slots__ = ("base_url", "api_key", "timeout", "_session")
+
     def __init__(self, base_url: str, api_key: str, timeout: float):
         self.base_url = base_url
         self.api_key = api_key
         self.timeout = timeout
+        self._session = create_session({**JSON_HEADERS, "Authorization": f"Bearer {api_key}"})
 
     def generate(self, prompt: str, model: str, stream: bool = False, **kwargs) -> Any:
         messages = [{"role": "user", "content": prompt}]
         return self.generate_openai_compatible(messages, model, stream, **kwargs)
 
     def generate_openai_compatible(self, messages: list, model: str, stream: bool = False, **kwargs) -> Any:
-        headers = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        payload = _build_openai_payload(messages, model, stream, kwargs, OPENAI_OPTIONAL_KEYS)
+        logger.debug("%s request payload: %s", type(self).__name__, payload)
         
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": stream,
-            "temperature": kwargs.get('temperature', 0.1),
-            "max_tokens": kwargs.get('max_tokens', 4096),
-            "top_p": kwargs.get('top_p', 0.9)
-        }
-        logger.debug("LlamaCppProvider request payload: %s", payload)
-
-        optional_keys = [
-            "tools",
-            "functions",
-            "tool_choice",
-            "response_format",
-            "logit_bias",
-            "user",
-            "stop",
-            "n",
-            "presence_penalty",
-            "frequency_penalty",
-            "stream_options",
-            "seed"
-        ]
-        for key in optional_keys:
-            value = kwargs.get(key)
-            if value is not None:
-                payload[key] = value
-        
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=self.timeout,
-            stream=stream
-        )
+        response = self._post(f"{self.base_url}/chat/completions", payload, stream)
         response.raise_for_status()
         
-        if stream:
-            return response.iter_lines(decode_unicode=True)
-        else:
-            return response.json()
+        return self._read(response, stream)
 
 class LlamaCppProvider(AIProvider):
+    __slots__ = ("base_url", "timeout", "_session")
+
     def __init__(self, base_url: str, timeout: float):
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
+        self._session = create_session(JSON_HEADERS)
 
     def generate(self, prompt: str, model: str, stream: bool = False, **kwargs) -> Any:
         messages = [{"role": "user", "content": prompt}]
         return self.generate_openai_compatible(messages, model, stream, **kwargs)
 
-    def generate_openai_compatible(self, messages: list, model: str, stream: bool = False, **kwargs) -> Any:
-        headers = {
-            "Content-Type": "application/json; charset=utf-8"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": stream,
-            "temperature": kwargs.get('temperature', 0.1),
-            "max_tokens": kwargs.get('max_tokens', 4096),
-            "top_p": kwargs.get('top_p', 0.9)
-        }
+    def generate_batch(self, prompts: List[str], model: str, concurrency: int = 8, **kwargs) -> List[Any]:
+        # llama.cpp server accepts a prompt list on its OpenAI-compatible completions route
+        return self._completions_batch(f"{self.base_url}/v1/completions", prompts, model,
+                                       LLAMACPP_OPTIONAL_PARAMS, **kwargs)
 
+    def generate_openai_compatible(self, messages: list, model: str, stream: bool = False, **kwargs) -> Any:
         # llama.cpp server also supports optional parameters such as top_k or repeat_penalty.
-        # Pass through if provided in kwargs.
-        optional_params = ["top_k", "repeat_penalty", "min_p", "presence_penalty", "frequency_penalty", "stop"]
-        for param in optional_params:
-            if param in kwargs and kwargs[param] is not None:
-                payload[param] = kwargs[param]
-
-        response = requests.post(
-            f"{self.base_url}/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=self.timeout,
-            stream=stream
-        )
+        payload = _build_openai_payload(messages, model, stream, kwargs, LLAMACPP_OPTIONAL_PARAMS)
+
+        response = self._post(f"{self.base_url}/v1/chat/completions", payload, stream)
         response.raise_for_status()
         # Force UTF-8 encoding to avoid ISO-8859-1 defaults
         response.encoding = "utf-8"
-        logger.debug("LlamaCppProvider response status: %s", response.status_code)
-        logger.debug("LlamaCppProvider response encoding (forced): %s", response.encoding)
-        logger.debug("LlamaCppProvider response content (truncated to 200 chars): %s", response.text[:200])
-        if stream:
-            return response.iter_lines(decode_unicode=True)
-        else:
-            return response.json()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("LlamaCppProvider response status: %s", response.status_code)
+            logger.debug("LlamaCppProvider response encoding (forced): %s", response.encoding)
+            # Reading .text would pull the whole body before a stream is consumed
+            if not stream:
+                logger.debug("LlamaCppProvider response content (truncated to 200 chars): %s", response.text[:200])
+        return self._read(response, stream)
+
+class CachedProvider(AIProvider):
+    """
+    Exact-match LRU cache in front of another provider.
+
+    Only deterministic calls are cached: non-streaming requests with
+    ``temperature`` 0. The key is a BLAKE2 digest of the model, the prompt or
+    messages and every generation option, so any difference is a miss.
+    """
+
+    __slots__ = ("provider", "max_entries", "_entries", "_lock")
+
+    def __init__(self, provider: AIProvider, max_entries: int = 256):
+        self.provider = provider
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def _session(self) -> requests.Session:
+        return self.provider._session
+
+    def close(self) -> None:
+        self.provider.close()
+
+    def generate_batch(self, prompts: List[str], model: str, concurrency: int = 8, **kwargs) -> List[Any]:
+        # Keep the wrapped provider's single-request batch path
+        return self.provider.generate_batch(prompts, model, concurrency, **kwargs)
+
+    @staticmethod
+    def _key(kind: str, model: str, content: Any, kwargs: Dict[str, Any]) -> Optional[bytes]:
+        try:
+            raw = json_codec.dumps([kind, model, content, sorted(kwargs.items())])
+        except TypeError:
+            return None  # options that cannot be serialised are never cached
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    def _cached(self, key: Optional[bytes], call) -> Any:
+        if key is None:
+            return call()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(self._entries[key])
+        result = call()
+        with self._lock:
+            self._entries[key] = copy.deepcopy(result)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def generate(self, prompt: str, model: str, stream: bool = False, **kwargs) -> Any:
+        if stream or kwargs.get('temperature', 0.1) != 0:
+            return self.provider.generate(prompt, model, stream, **kwargs)
+        key = self._key("generate", model, prompt, kwargs)
+        return self._cached(key, lambda: self.provider.generate(prompt, model, False, **kwargs))
+
+    def generate_openai_compatible(self, messages: list, model: str, stream: bool = False, **kwargs) -> Any:
+        if stream or kwargs.get('temperature', 0.1) != 0:
+            return self.provider.generate_openai_compatible(messages, model, stream, **kwargs)
+        key = self._key("chat", model, messages, kwargs)
+        return self._cached(key, lambda: self.provider.generate_openai_compatible(
+            messages, model, False, **kwargs))
 
 class AIProviderFactory:
+    # Provider class and the config keys passed positionally to its constructor
+    _REGISTRY = {
+        "openai": (OpenAIProvider, ("OPENAI_BASE_URL", "OPENAI_API_KEY", "REQUEST_TIMEOUT")),
+        "mistral": (MistralProvider, ("MISTRAL_BASE_URL", "MISTRAL_API_KEY", "REQUEST_TIMEOUT")),
+        "llamacpp": (LlamaCppProvider, ("LLAMACPP_BASE_URL", "REQUEST_TIMEOUT")),
+        "ollama": (OllamaProvider, ("OLLAMA_BASE_URL", "REQUEST_TIMEOUT")),
+    }
+    _ALIASES = {"llama.cpp": "llamacpp", "llama": "llamacpp"}
+
     @staticmethod
     def create_provider(config: Dict[str, Any]) -> AIProvider:
+        """
+        Return the provider for ``config``. Equal settings share one provider
+        instance (and so one connection pool); unknown types fall back to Ollama.
+        """
         provider_type = str(config.get("AI_PROVIDER", "ollama")).strip().lower()
-        
-        if provider_type == "openai":
-            return OpenAIProvider(
-                base_url=config["OPENAI_BASE_URL"],
-                api_key=config["OPENAI_API_KEY"],
-                timeout=config["REQUEST_TIMEOUT"]
-            )
-        elif provider_type == "mistral":
-            return MistralProvider(
-                base_url=config["MISTRAL_BASE_URL"],
-                api_key=config["MISTRAL_API_KEY"],
-                timeout=config["REQUEST_TIMEOUT"]
-            )
-        elif provider_type in ("llamacpp", "llama.cpp", "llama"):
-            return LlamaCppProvider(
-                base_url=config["LLAMACPP_BASE_URL"],
-                timeout=config["REQUEST_TIMEOUT"]
-            )
-        else:  # ollama (default)
-            return OllamaProvider(
-                base_url=config["OLLAMA_BASE_URL"],
-                timeout=config["REQUEST_TIMEOUT"]
-            )
+        provider_type = AIProviderFactory._ALIASES.get(provider_type, provider_type)
+        if provider_type not in AIProviderFactory._REGISTRY:
+            provider_type = "ollama"
+        _, keys = AIProviderFactory._REGISTRY[provider_type]
+        return AIProviderFactory._shared_provider(
+            provider_type,
+            tuple(config[key] for key in keys),
+            config.get("RESPONSE_CACHE_SIZE", 0)
+        )
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _shared_provider(provider_type: str, args: tuple, cache_size: int) -> AIProvider:
+        provider_class, _ = AIProviderFactory._REGISTRY[provider_type]
+        provider = provider_class(*args)
+        if cache_size:
+            return CachedProvider(provider, max_entries=cache_size)
+        return provider
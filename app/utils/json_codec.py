@@ -0,0 +1,55 @@
+# app/utils/json_codec.py
+"""
+JSON helpers for the hot request/response paths.
+
+orjson is used when it is installed: it parses straight from UTF-8 bytes and
+serialises straight to UTF-8 bytes. Without it the standard library is used
+with equivalent settings, so callers never need to know which backend is active.
+"""
+import json
+
+from flask import request
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+if orjson is not None:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError (and ValueError)
+    JSONDecodeError = orjson.JSONDecodeError
+
+    def loads(data):
+        """Parse JSON from ``str``, ``bytes``, ``bytearray`` or ``memoryview``."""
+        return orjson.loads(data)
+
+    def dumps(obj) -> bytes:
+        """Serialise ``obj`` to compact UTF-8 JSON bytes (non-ASCII kept as-is)."""
+        return orjson.dumps(obj)
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+    def loads(data):
+        """Parse JSON from ``str``, ``bytes`` or ``bytearray``."""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(obj) -> bytes:
+        """Serialise ``obj`` to compact UTF-8 JSON bytes (non-ASCII kept as-is)."""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_body():
+    """
+    Parse the current request body, treating an empty body as ``{}``.
+
+    Reads the raw bytes without Flask's body cache or ``request.get_json``
+    caching; raises ``JSONDecodeError`` on malformed input and on bodies that
+    are valid JSON but not an object (``null``, arrays, scalars).
+    """
+    raw = request.get_data(cache=False) or b'{}'
+    data = loads(raw)
+    if not isinstance(data, dict):
+        raise JSONDecodeError("Expecting a JSON object", raw.decode('utf-8', 'replace'), 0)
+    return data
@@ -1,19 +1,31 @@
 # app/utils/multi_processor_state_machine.py
-import re
+import io
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# First line that opens a header or a code fence once stripped; [^\S\n] is
+# whitespace within a line, matching what str.strip() removes
+_FIRST_MARKER_RE = re.compile(r'^[^\S\n]*(?:###|```)', re.MULTILINE)
+
 class MultiProcessorStateMachine:
+    __slots__ = (
+        'current_state', 'result', '_code_lines',
+        'processor_registry', '_pattern_to_processor', 'pattern_requirements',
+    )
+
+    # Define states; small ints so they index _STATE_HANDLERS directly
+    START = 0
+    IN_HEADER = 1
+    IN_CODE_BLOCK = 2
+    COMPLETE = 3
+
     def __init__(self):
-        # Define states
-        self.START = "START"
-        self.IN_HEADER = "IN_HEADER"
-        self.IN_CODE_BLOCK = "IN_CODE_BLOCK"
-        self.COMPLETE = "COMPLETE"
-        
         self.current_state = self.START
         self.result = {}
+        # Lines of the code block being read; None outside a block
+        self._code_lines = None
         
         # Processor registry - maps processor names to their patterns
         self.processor_registry = {
@@ -37,6 +49,17 @@ class MultiProcessorStateMachine:
                 ]
             }
         }
+
+        # Pattern lists are fixed once registered
+        for info in self.processor_registry.values():
+            info['patterns'] = tuple(info['patterns'])
+
+        # Inverted index: pattern -> (processor key, processor name)
+        self._pattern_to_processor = {
+            pattern: (processor_key, info['name'])
+            for processor_key, info in self.processor_registry.items()
+            for pattern in info['patterns']
+        }
         
         # Required fields for each pattern
         self.pattern_requirements = {
@@ -63,6 +86,9 @@ class MultiProcessorStateMachine:
             'bible_query': ['question'],
             'scripture_analysis': ['passage']
         }
+        self.pattern_requirements = {
+            pattern: tuple(fields) for pattern, fields in self.pattern_requirements.items()
+        }
     
     def process(self, message):
         """Process message and determine which processor to use"""
@@ -86,12 +112,21 @@ class MultiProcessorStateMachine:
                 f"`list` of `str`, got {type(message)!r}."
             )
 
-        lines = message.split('\n')
-        
+        # The START state ignores every line until the first header or fence,
+        # so the regex engine skips that prefix in one scan; the rest is read
+        # lazily so a message that completes early never has its tail split
+        first = _FIRST_MARKER_RE.search(message)
+        lines = io.StringIO(message[first.start():]) if first else ()
         for line in lines:
             if self.current_state == self.COMPLETE:
                 break
             self._process_line(line.strip())
+        # split('\n') semantics: a trailing newline ends in one more, empty
+        # line, which only matters inside an open code block
+        if self.current_state == self.IN_CODE_BLOCK and message.endswith('\n'):
+            self._process_line('')
+        # An unterminated code block still contributes its lines
+        self._flush_code()
             
         return self._get_processor_result()
     
@@ -99,52 +134,84 @@ class MultiProcessorStateMachine:
         """Reset state machine for new message"""
         self.current_state = self.START
         self.result = {}
+        self._code_lines = None
     
     def _process_line(self, line):
         """Process a single line based on current state"""
-        if self.current_state == self.START:
-            self._handle_start_state(line)
-        elif self.current_state == self.IN_HEADER:
-            self._handle_header_state(line)
-        elif self.current_state == self.IN_CODE_BLOCK:
-            self._handle_code_state(line)
+        handler = self._STATE_HANDLERS[self.current_state]
+        if handler is not None:
+            handler(self, line)
     
     def _handle_start_state(self, line):
         """START state - look for valid starting tokens"""
-        if line.startswith('```'):
+        # Both markers are three characters: slice once, compare twice
+        prefix = line[:3]
+        if prefix == '```':
             self.current_state = self.IN_CODE_BLOCK
             self._handle_code_state(line)
-        elif line.startswith('###'):
+        elif prefix == '###':
             self.current_state = self.IN_HEADER
             self._handle_header_state(line)
     
     def _handle_header_state(self, line):
         """IN_HEADER state - process structured headers"""
-        if line.startswith('```'):
+        prefix = line[:3]
+        if prefix == '```':
             self.current_state = self.IN_CODE_BLOCK
             self._handle_code_state(line)
-        elif line.startswith('###'):
+        elif prefix == '###':
             self._parse_header(line)
         else:
             self._capture_content(line)
     
     def _handle_code_state(self, line):
         """IN_CODE_BLOCK state - capture code content"""
+        code_lines = self._code_lines
         if line.startswith('```'):
-            if self.result.get('code'):
+            has_code = code_lines if code_lines is not None else self.result.get('code')
+            if has_code:
+                self._flush_code()
                 self.current_state = self.IN_HEADER
         else:
-            current_code = self.result.get('code', '')
-            self.result['code'] = current_code + '\n' + line if current_code else line
+            if code_lines is None:
+                # Continue any code already captured (e.g. a "### code:" header)
+                existing = self.result.get('code')
+                code_lines = self._code_lines = [existing] if existing else []
+            # Leading blank lines are dropped
+            if line or code_lines:
+                code_lines.append(line)
+
+    def _flush_code(self):
+        """Join the buffered code lines into result['code']"""
+        if self._code_lines is not None:
+            self.result['code'] = '\n'.join(self._code_lines)
+            self._code_lines = None
+
+    # Field that continuation lines extend, per pattern
+    _CONTENT_FIELDS = {
+        'custom': 'prompt',
+        'write_code': 'task', 
+        'fix_bug': 'issue',
+        'improve_code': 'issue',
+        'psalm_query': 'question',
+        'psalm_search': 'question',
+        'bible_query': 'question',
+        'scripture_analysis': 'context',
+        'patristic_exposition': 'context'
+    }
+
+    # Line handler per state, indexed by the state constants (COMPLETE reads nothing)
+    _STATE_HANDLERS = (_handle_start_state, _handle_header_state, _handle_code_state, None)
     
     def _parse_header(self, line):
         """Parse ### Key: value headers"""
-        match = re.match(r'###\s*(\w+):\s*(.*)', line)
-        if not match:
+        # Equivalent to ###\s*(\w+):\s*(.*) without going through the regex engine
+        key, sep, value = line[3:].lstrip().partition(':')
+        if not sep or not key.replace('_', 'a').isalnum():
             return
-            
-        key = match.group(1).lower().strip()
-        value = match.group(2).strip()
+
+        key = key.lower()
+        value = value.strip()
         
         # Store all headers in result
         self.result[key] = value
@@ -175,22 +242,12 @@ class MultiProcessorStateMachine:
         pattern = self.result.get('pattern')
         if not pattern:
             return
-            
-        content_fields = {
-            'custom': 'prompt',
-            'write_code': 'task', 
-            'fix_bug': 'issue',
-            'improve_code': 'issue',
-            'psalm_query': 'question',
-            'psalm_search': 'question',
-            'bible_query': 'question',
-            'scripture_analysis': 'context',
-            'patristic_exposition': 'context'
-        }
         
-        field = content_fields.get(pattern)
+        field = self._CONTENT_FIELDS.get(pattern)
         if field and field in self.result:
-            self.result[field] += '\n' + line
+            # A header with an empty value takes its text from the next line
+            value = self.result[field]
+            self.result[field] = value + '\n' + line if value else line
     
     def _is_valid_processor(self, processor):
         """Check if processor is in registry"""
@@ -198,14 +255,11 @@ class MultiProcessorStateMachine:
     
     def _is_valid_pattern_for_processor(self, pattern, processor):
         """Check if pattern is valid for the specified processor"""
-        processor_info = self.processor_registry.get(processor)
-        if not processor_info:
-            return False
-        return pattern in processor_info['patterns']
+        return self._pattern_to_processor.get(pattern, (None, None))[0] == processor
     
     def _can_complete_pattern(self, pattern):
         """Check if we have all required fields for this pattern"""
-        required_fields = self.pattern_requirements.get(pattern, [])
+        required_fields = self.pattern_requirements.get(pattern, ())
         return all(field in self.result and self.result[field] for field in required_fields)
     
     def _get_processor_result(self):
@@ -228,24 +282,21 @@ class MultiProcessorStateMachine:
         
         if specified_processor:
             # Use explicitly specified processor
-            processor_info = self.processor_registry.get(specified_processor)
-            if processor_info and pattern in processor_info['patterns']:
-                processor_name = processor_info['name']
+            if self._is_valid_pattern_for_processor(pattern, specified_processor):
+                processor_name = self._pattern_to_processor[pattern][1]
             else:
                 logger.warning(f"Pattern '{pattern}' not valid for specified processor '{specified_processor}'")
                 return None
         else:
             # Auto-detect processor based on pattern
-            for processor_key, processor_info in self.processor_registry.items():
-                if pattern in processor_info['patterns']:
-                    processor_name = processor_info['name']
-                    break
+            hit = self._pattern_to_processor.get(pattern)
+            processor_name = hit[1] if hit else None
         
         if not processor_name:
             return None
             
         # Validate required fields
-        required_fields = self.pattern_requirements.get(pattern, [])
+        required_fields = self.pattern_requirements.get(pattern, ())
         missing_fields = [field for field in required_fields if not self.result.get(field)]
         
         if missing_fields:
@@ -256,10 +307,11 @@ class MultiProcessorStateMachine:
         if not self.result.get('language'):
             self.result['language'] = 'Python'
             
-        # Clean up fields
-        for field in self.result:
-            if isinstance(self.result[field], str):
-                self.result[field] = self.result[field].strip()
+        # Header values and captured content lines are stripped as they are
+        # stored; only a code block can still carry trailing blank lines
+        code = self.result.get('code')
+        if code:
+            self.result['code'] = code.strip()
         
         return {
             'processor': processor_name,
@@ -284,7 +336,11 @@ class MultiProcessorStateMachine:
     
     def get_pattern_requirements(self, pattern):
         """Get required fields for a specific pattern"""
-        return self.pattern_requirements.get(pattern, [])
+        return self.pattern_requirements.get(pattern, ())
+
+    def find_processor(self, pattern):
+        """Return (processor key, processor name) for a pattern, or None"""
+        return self._pattern_to_processor.get(pattern)
     
     def _infer_pattern_from_fields(self, processor):
         """Infer pattern from available fields when pattern is not explicitly specified"""
@@ -1,22 +1,99 @@
 # app/utils/pattern_detector.py
 import re
+import sys
+import copy
 import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from .multi_processor_state_machine import MultiProcessorStateMachine
 
 logger = logging.getLogger(__name__)
 
+# Number of recent string messages whose detection result is remembered per instance
+DETECT_CACHE_SIZE = 256
+
+# Compiled once at import; these run for every line of every detected message
+# Chat payload headers (tolerate extra whitespace and case-insensitivity)
+_CHAT_PROCESSOR_RE = re.compile(r'###\s*processor\s*:\s*(\w+)', re.IGNORECASE)
+_CHAT_PATTERN_RE = re.compile(r'###\s*pattern\s*:\s*(\w+)', re.IGNORECASE)
+_CHAT_KV_RE = re.compile(r'###\s*([\w-]+)\s*:\s*(.+)', re.IGNORECASE)
+# Structured "### Header: value" format
+# Line separators other than "\n" that str.splitlines() honours
+_LINE_BREAK_RE = re.compile(r'[\r\v\f\x1c-\x1e\x85\u2028\u2029]')
+# Header lines of a newline-joined message; [^\S\n] is whitespace within a line
+_HEADER_LINE_RE = re.compile(r'^[^\S\n]*###[^\S\n]*([\w-]+)[^\S\n]*:?[^\S\n]*(.*)', re.MULTILINE)
+_WORD_RE = re.compile(r'\w+')
+# Code blocks and language hints
+_FENCED_CODE_RE = re.compile(r'```(?:\w+)?\s*\n(.*?)```', re.DOTALL)
+_CODE_MARKER_RE = re.compile(r'###\s*Code\s*(?:\n|$)', re.IGNORECASE)
+_NEXT_HEADER_RE = re.compile(r'\n###\s')
+_LANGUAGE_RE = re.compile(r'###\s*Language\s*:\s*([\w\+#]+)', re.IGNORECASE)
+_FENCE_LANGUAGE_RE = re.compile(r'```(\w+)')
+_ISSUE_RE = re.compile(r'fix[_-]?bug\s*[:\-]\s*(.+)', re.IGNORECASE)
+
+# Languages the detector knows, lower-case as written in "### Language:" headers
+_SUPPORTED_LANGUAGES = (
+    'python', 'javascript', 'java', 'c++', 'c#', 'go',
+    'rust', 'php', 'ruby', 'swift', 'typescript', 'bash',
+    'awk', 'gnuplot', 'latin'
+)
+# Title-case gives “Javascript”, “C++”, “C#”, etc.; computed and interned once
+# so every detector hands out the same string objects
+_LANGUAGE_TITLES = tuple(sys.intern(lang.title()) for lang in _SUPPORTED_LANGUAGES)
+
+# Patterns accepted by the structured "### Pattern:" format
+_SUPPORTED_PATTERNS = (
+    'write_code',
+    'refactor_code',
+    'write_test',
+    'fix_bug',
+    'explain_code',
+    'add_docs'
+)
+# Hashed membership checks on the parse path
+_SUPPORTED_PATTERN_SET = frozenset(_SUPPORTED_PATTERNS)
+
+
+def _task_re(pattern: str):
+    """Regex capturing the task text that follows ``<pattern>:`` or ``<pattern> -``"""
+    return re.compile(rf'{re.escape(pattern)}\s*[:\-]\s*(.+)', re.IGNORECASE)
+
+
+# Task regexes for the known patterns, built once
+_TASK_RES = {pattern: _task_re(pattern) for pattern in _SUPPORTED_PATTERNS}
+
+
+@lru_cache(maxsize=256)
+def _language_of(message: str) -> str:
+    """Language header, else fenced-block hint, else Python; cached per message"""
+    # Header form
+    hdr = _LANGUAGE_RE.search(message) if '###' in message else None
+    if hdr:
+        return hdr.group(1).strip()
+
+    # fenced block language hint
+    start = message.find('```')
+    fence = _FENCE_LANGUAGE_RE.search(message, start) if start != -1 else None
+    if fence:
+        return fence.group(1).strip()
+
+    return 'Python'
+
+
 class PatternDetector:
+    __slots__ = ('supported_languages', '_language_titles', 'state_machine', '_detect_cache')
+
     # --------------------------------------------------------------------- #
     #                     Construction / basic data
     # --------------------------------------------------------------------- #
     def __init__(self):
         # keep the original lower‑case list (used internally)
-        self.supported_languages = [
-            'python', 'javascript', 'java', 'c++', 'c#', 'go',
-            'rust', 'php', 'ruby', 'swift', 'typescript', 'bash',
-            'awk', 'gnuplot', 'latin'
-        ]
+        self.supported_languages = list(_SUPPORTED_LANGUAGES)
+        self._language_titles = _LANGUAGE_TITLES
         self.state_machine = MultiProcessorStateMachine()
+        # message -> detection result, least recent first
+        self._detect_cache = OrderedDict()
 
     # --------------------------------------------------------------------- #
     #                     Public helper API (new / restored)
@@ -47,22 +124,14 @@ class PatternDetector:
         expected by the tests).  Internally we keep a lower‑case list, so we
         simply capitalise each entry.
         """
-        # Title‑case gives “Javascript”, “C++”, “C#”, etc.
-        return [lang.title() for lang in self.supported_languages]
+        return list(self._language_titles)
 
     def get_supported_patterns(self):
         """
         Return the canonical list of patterns that the detector recognises.
         The list mirrors the patterns that the state‑machine knows about.
         """
-        return [
-            'write_code',
-            'refactor_code',
-            'write_test',
-            'fix_bug',
-            'explain_code',
-            'add_docs'
-        ]
+        return list(_SUPPORTED_PATTERNS)
 
     # --------------------------------------------------------------------- #
     #                     Core detection entry point
@@ -82,9 +151,30 @@ class PatternDetector:
             return self._detect_from_chat_payload(message)
 
         # --------------------------------------------------------------- #
-        # 2️⃣  Structured‑text handling (original implementation)
+        # 2️⃣  Structured‑text handling, replayed for repeated messages
         # --------------------------------------------------------------- #
-        logger.debug(f"Pattern detection for message: {str(message)[:100]}...")
+        if not isinstance(message, str):
+            return self._detect_from_text(message)
+        # Processor and pattern only ever come from "###" headers, so plain
+        # prose cannot match and skips the parsers (and the cache)
+        if '###' not in message:
+            logger.info("❌ No valid structured pattern found")
+            return None
+        cache = self._detect_cache
+        if message in cache:
+            cache.move_to_end(message)
+            # callers mutate the result, so hand out a fresh copy
+            return copy.deepcopy(cache[message])
+
+        result = self._detect_from_text(message)
+        cache[message] = copy.deepcopy(result)
+        if len(cache) > DETECT_CACHE_SIZE:
+            cache.popitem(last=False)
+        return result
+
+    def _detect_from_text(self, message):
+        """Run the state machine and the structured parser over a raw string"""
+        logger.debug("Pattern detection for message: %.100s...", message)
         # first try the state‑machine (keeps existing behaviour)
         result = self.state_machine.process(message)
         if result:
@@ -111,8 +201,9 @@ class PatternDetector:
                     result[key] = value
 
             logger.info(
-                f"✅ {'EXPLICIT' if result['specified_processor'] else 'AUTO‑DETECTED'} "
-                f"- Pattern '{result['pattern_data']['pattern']}' → Processor: {result['processor']}"
+                "✅ %s - Pattern '%s' → Processor: %s",
+                'EXPLICIT' if result['specified_processor'] else 'AUTO‑DETECTED',
+                result['pattern_data']['pattern'], result['processor']
             )
             return result
 
@@ -120,13 +211,14 @@ class PatternDetector:
         parsed = self._parse_structured_format(message)
         if parsed:
             # mimic the shape of the state‑machine output
-            return {
+            result = {
                 'processor': self.detect_processor_from_pattern(parsed['pattern']),
                 'pattern_data': parsed,
                 'specified_processor': False,
                 'pattern': parsed['pattern'],
-                **parsed
             }
+            result.update(parsed)
+            return result
 
         logger.info("❌ No valid structured pattern found")
         return None
@@ -150,25 +242,24 @@ class PatternDetector:
         processor = None
         pattern = None
 
-        # Regexes that tolerate extra whitespace and case‑insensitivity
-        proc_re = re.compile(r'###\s*processor\s*:\s*(\w+)', re.IGNORECASE)
-        pat_re  = re.compile(r'###\s*pattern\s*:\s*(\w+)', re.IGNORECASE)
-        kv_re   = re.compile(r'###\s*([\w-]+)\s*:\s*(.+)', re.IGNORECASE)
-
         for entry in payload:
             content = entry.get('content', '')
+            # All three headers need a literal "###"; most chat turns are
+            # plain prose and can skip the regex searches entirely
+            if '###' not in content:
+                continue
             # Processor line
-            m = proc_re.search(content)
+            m = _CHAT_PROCESSOR_RE.search(content)
             if m:
                 processor = m.group(1).strip()
                 continue
             # Pattern line
-            m = pat_re.search(content)
+            m = _CHAT_PATTERN_RE.search(content)
             if m:
                 pattern = m.group(1).strip()
                 continue
             # Generic key/value lines
-            m = kv_re.search(content)
+            m = _CHAT_KV_RE.search(content)
             if m:
                 key = m.group(1).strip().lower()
                 value = m.group(2).strip()
@@ -189,13 +280,14 @@ class PatternDetector:
         pattern_data = {'pattern': pattern} if pattern else {}
         pattern_data.update(data)
 
-        return {
+        result = {
             'processor': processor_name,
             'pattern_data': pattern_data,
             'specified_processor': True,
             'pattern': pattern,
-            **pattern_data
         }
+        result.update(pattern_data)
+        return result
 
     # --------------------------------------------------------------------- #
     #                     Private helper methods (used by tests)
@@ -210,18 +302,21 @@ class PatternDetector:
            and return everything that follows until the next ``###`` header or
            the end of the string.
         """
+        # Cheap substring probes first: most messages have no fence at all,
+        # and the regex search can start at the first one
         # 1️⃣ fenced block
-        fenced = re.findall(r'```(?:\w+)?\s*\n(.*?)```', message, re.DOTALL)
+        fence = message.find('```')
+        fenced = _FENCED_CODE_RE.search(message, fence) if fence != -1 else None
         if fenced:
-            return fenced[0].strip()
+            return fenced.group(1).strip()
 
         # 2️⃣ legacy “### Code” marker
-        code_marker = re.search(r'###\s*Code\s*(?:\n|$)', message, re.IGNORECASE)
+        code_marker = _CODE_MARKER_RE.search(message) if '###' in message else None
         if code_marker:
             start = code_marker.end()
             # stop at the next header (###) or the end of the string
-            end_match = re.search(r'\n###\s', message[start:])
-            end = start + end_match.start() if end_match else len(message)
+            end_match = _NEXT_HEADER_RE.search(message, start)
+            end = end_match.start() if end_match else len(message)
             return message[start:end].strip()
 
         return ""
@@ -234,17 +329,7 @@ class PatternDetector:
         - Then tries the language identifier after a fenced block (e.g. `````swift````).
         - Falls back to ``Python`` (the default used throughout the project).
         """
-        # Header form
-        hdr = re.search(r'###\s*Language\s*:\s*([\w\+#]+)', message, re.IGNORECASE)
-        if hdr:
-            return hdr.group(1).strip()
-
-        # fenced block language hint
-        fence = re.search(r'```(\w+)', message)
-        if fence:
-            return fence.group(1).strip()
-
-        return 'Python'
+        return _language_of(message)
 
     def _parse_structured_format(self, message: str):
         """
@@ -253,68 +338,51 @@ class PatternDetector:
         Returns a ``dict`` with the extracted fields or ``None`` if the
         ``Pattern`` header is missing or unknown.
         """
-        # Normalise line endings
-        lines = [ln.rstrip() for ln in message.splitlines()]
-
-        # Helper to pull a multi‑line value after a header
-        def pull_value(start_idx):
-            values = []
-            for ln in lines[start_idx + 1:]:
-                if re.match(r'^\s*###\s*\w+', ln):   # next header
-                    break
-                values.append(ln)
-            return "\n".join(v for v in values if v).strip()
+        # Header lines are found with one MULTILINE scan, which only treats
+        # "\n" as a line break; normalise through splitlines() only when the
+        # message uses another separator (\r, form feed, U+2028, ...)
+        text = "\n".join(message.splitlines()) if _LINE_BREAK_RE.search(message) else message
+        headers = list(_HEADER_LINE_RE.finditer(text))
 
         data = {}
-        i = 0
-        while i < len(lines):
-            line = lines[i]
+        k = 0
+        while k < len(headers):
+            m = headers[k]
+            key = m.group(1).lower()
+            k += 1
 
             # ----------------------------------------------------------- #
-            # Pattern header (mandatory)
+            # Pattern header (mandatory): only its first word counts
             # ----------------------------------------------------------- #
-            m = re.match(r'^\s*###\s*Pattern\s*:?\s*(\w+)', line, re.IGNORECASE)
-            if m:
-                data['pattern'] = m.group(1).strip()
-                i += 1
-                continue
+            if key == 'pattern':
+                word = _WORD_RE.match(m.group(2))
+                if word:
+                    data['pattern'] = word.group(0)
+                    continue
 
             # ----------------------------------------------------------- #
             # Generic key/value header (allow optional colon)
             # ----------------------------------------------------------- #
-            m = re.match(r'^\s*###\s*([\w-]+)\s*:?\s*(.*)', line, re.IGNORECASE)
-            if m:
-                key = m.group(1).lower()
-                # start with whatever is after the colon on the same line
-                value_parts = [m.group(2).strip()] if m.group(2).strip() else []
-
-                # -----------------------------------------------------------------
-                # Collect following lines that are *not* a new ### header.
-                # This works for both:
-                #   - value on the next line only
-                #   - value on the same line **and** continues on later lines
-                # -----------------------------------------------------------------
-                j = i + 1
-                while j < len(lines):
-                    nxt = lines[j]
-                    if re.match(r'^\s*###\s*\w+', nxt):
-                        break
-                    value_parts.append(nxt.rstrip())
-                    j += 1
-
-                # Join the collected parts, stripping trailing new‑lines/spaces
-                value = "\n".join(part for part in value_parts if part).strip()
-                data[key] = value
-                i = j
-                continue
-
-            i += 1
+            # "### -x" lines do not end a value; they are swallowed by it
+            while k < len(headers) and headers[k].group(1)[0] == '-':
+                k += 1
+            end = headers[k].start() if k < len(headers) else len(text)
+
+            # Whatever is after the colon on the same line, then every
+            # following non-blank line up to the next header
+            same_line = m.group(2).strip()
+            value_parts = [same_line] if same_line else []
+            for part in text[m.end():end].split("\n"):
+                part = part.rstrip()
+                if part:
+                    value_parts.append(part)
+            data[key] = "\n".join(value_parts).strip()
 
            
         # Must have a known pattern
         if 'pattern' not in data:
             return None
-        if data['pattern'] not in self.get_supported_patterns():
+        if data['pattern'] not in _SUPPORTED_PATTERN_SET:
             return None
 
         # Normalise language
@@ -337,13 +405,13 @@ class PatternDetector:
     # --------------------------------------------------------------------- #
     def _extract_issue_description(self, message: str) -> str:
         """Extract the text after ``fix_bug:``."""
-        m = re.search(r'fix[_-]?bug\s*[:\-]\s*(.+)', message, re.IGNORECASE)
+        m = _ISSUE_RE.search(message)
         return m.group(1).strip() if m else ''
 
     def _extract_task_after_pattern(self, message: str, pattern: str) -> str:
         """Extract the task description that follows ``<pattern>:``."""
-        esc = re.escape(pattern)
-        m = re.search(rf'{esc}\s*[:\-]\s*(.+)', message, re.IGNORECASE)
+        task_re = _TASK_RES.get(pattern) or _task_re(pattern)
+        m = task_re.search(message)
         return m.group(1).strip() if m else ''
 
     # --------------------------------------------------------------------- #
@@ -353,11 +421,8 @@ class PatternDetector:
         """
         Detect which processor handles a specific pattern
         """
-        processors = self.get_supported_processors()
-        for processor_key, processor_info in processors.items():
-            if pattern in processor_info['patterns']:
-                return processor_key
-        return None
+        hit = self.state_machine.find_processor(pattern)
+        return hit[0] if hit else None
 
     def is_pattern_supported(self, pattern):
         """
@@ -369,11 +434,8 @@ class PatternDetector:
         """
         Get the processor name for a specific pattern
         """
-        processor_key = self.detect_processor_from_pattern(pattern)
-        if processor_key:
-            processors = self.get_supported_processors()
-            return processors[processor_key]['name']
-        return None
+        hit = self.state_machine.find_processor(pattern)
+        return hit[1] if hit else None
 
     # --------------------------------------------------------------------- #
     #                     Legacy compatibility helpers
@@ -451,6 +513,17 @@ class PatternDetector:
 # ------------------------------------------------------------------------- #
 # Legacy factory (kept for backwards compatibility)
 # ------------------------------------------------------------------------- #
+# The state machine keeps per-parse state on the instance, so a detector is
+# reused within a thread but never shared between threads
+_default_local = threading.local()
+
+
 def create_pattern_detector():
-    """Factory function to create a pattern detector (for backward compatibility)"""
-    return PatternDetector()
+    """
+    Return this thread's shared pattern detector, creating it on first use.
+    Callers that need a private instance construct ``PatternDetector()``.
+    """
+    detector = getattr(_default_local, 'detector', None)
+    if detector is None:
+        detector = _default_local.detector = PatternDetector()
+    return detector
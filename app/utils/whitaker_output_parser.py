@@ -5,6 +5,42 @@ from typing import Dict, List, Any, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Part-of-speech tags in priority order.  The first tag found anywhere in the
+# output wins (so "V" also fires inside "ADV", as it always has)
+_PART_OF_SPEECH_TAGS = (
+    ("V", "verb"), ("N", "noun"), ("ADJ", "adjective"), ("ADV", "adverb"),
+    ("PRON", "pronoun"), ("PREP", "preposition"), ("CONJ", "conjunction"),
+    ("INTERJ", "interjection"), ("NUM", "numeral"),
+)
+
+# Gender lookups, checked in order: Whitaker's codes on the first line, then
+# keywords anywhere in the lower-cased output
+_GENDER_CODES = ((" M ", "masculine"), (" F ", "feminine"), (" N ", "neuter"))
+_GENDER_WORDS = (("masc", "masculine"), ("fem", "feminine"), ("neut", "neuter"))
+
+# Compiled once at import; the translation filters run for every output line
+_LEMMA_RE = re.compile(r"^([a-zA-Z]+),")
+_LEMMA_LINE_RE = re.compile(r"^([a-zA-Z]+),", re.MULTILINE)
+_STEM_LINE_RE = re.compile(r'^[a-z]+\.[a-z]+\s+[A-Z]')      # "dur.us ADJ" lines
+_PARTS_LINE_RE = re.compile(r'^[a-zA-Z]+,\s*[a-zA-Z]')      # "durus, dura" lines
+_FREQUENCY_CODE_RE = re.compile(r'\[XXX[A-Z]\]')
+_CONJUGATION_RE = re.compile(r"V\s*\((\d)(?:st|nd|rd|th)\)")
+_CONJUGATION_CODE_RE = re.compile(r"V\s+(\d)\s+\d")
+_DECLENSION_RE = re.compile(r"(?:N|ADJ)\s*\((\d)(?:st|nd|rd|th)\)")
+_DECLENSION_CODE_RE = re.compile(r"(?:ADJ|N)\s+(\d)\s+\d")
+_INFINITIVE_RE = re.compile(r"^[a-zA-Z]+,\s*([a-zA-Z]+)")
+_PERFECT_RE = re.compile(r"^[a-zA-Z]+,\s*[a-zA-Z]+,\s*([a-zA-Z]+)")
+_SUPINE_RE = re.compile(r"^[a-zA-Z]+,\s*[a-zA-Z]+,\s*[a-zA-Z]+,\s*([a-zA-Z]+)")
+_ABLATIVE_RE = re.compile(r"\b(\w+)\s*\(Abl\)")
+_TENSE_RES = {
+    "present": re.compile(r"Pres\s+([a-zA-Z]+)"),
+    "perfect": re.compile(r"Perf\s+([a-zA-Z]+)"),
+}
+_MOOD_RES = {
+    "imperative": re.compile(r"Imper\s+([a-zA-Z]+)"),
+    "subjunctive": re.compile(r"Subj\s+([a-zA-Z]+)"),
+}
+
 class WhitakerOutputParser:
     """
     Parser for Whitaker's word analysis output to extract structured data
@@ -53,25 +89,11 @@ class WhitakerOutputParser:
     
     def _determine_part_of_speech(self) -> Optional[str]:
         """Determine the part of speech from raw output."""
-        # Updated to handle both formats: with and without parentheses
-        if re.search(r"V(?:\s*\(.*\))?", self.raw_output):
-            return "verb"
-        elif re.search(r"N(?:\s*\(.*\))?", self.raw_output):
-            return "noun"
-        elif re.search(r"ADJ(?:\s*\(.*\))?", self.raw_output):
-            return "adjective"
-        elif re.search(r"ADV(?:\s*\(.*\))?", self.raw_output):
-            return "adverb"
-        elif re.search(r"PRON(?:\s*\(.*\))?", self.raw_output):
-            return "pronoun"
-        elif re.search(r"PREP(?:\s*\(.*\))?", self.raw_output):
-            return "preposition"
-        elif re.search(r"CONJ(?:\s*\(.*\))?", self.raw_output):
-            return "conjunction"
-        elif re.search(r"INTERJ(?:\s*\(.*\))?", self.raw_output):
-            return "interjection"
-        elif re.search(r"NUM(?:\s*\(.*\))?", self.raw_output):
-            return "numeral"
+        # Each tag may be followed by "(1st)"-style detail, but the bare tag
+        # is enough to match, so a substring test replaces nine regex searches
+        for tag, pos in _PART_OF_SPEECH_TAGS:
+            if tag in self.raw_output:
+                return pos
         return None
     
     def _extract_lemma(self) -> Optional[str]:
@@ -80,12 +102,12 @@ class WhitakerOutputParser:
         lines = self.raw_output.strip().split('\n')
         if len(lines) >= 2:
             # Second line typically has: "durus, dura -um, ..."
-            lemma_match = re.search(r"^([a-zA-Z]+),", lines[1])
+            lemma_match = _LEMMA_RE.search(lines[1])
             if lemma_match:
                 return lemma_match.group(1).lower()
         
         # Fallback: look anywhere in the output
-        lemma_match = re.search(r"^([a-zA-Z]+),", self.raw_output, re.MULTILINE)
+        lemma_match = _LEMMA_LINE_RE.search(self.raw_output)
         return lemma_match.group(1).lower() if lemma_match else None
     
     def _extract_translations(self) -> Dict[str, str]:
@@ -98,12 +120,11 @@ class WhitakerOutputParser:
         
         for line in lines:
             line = line.strip()
-            # Skip lines that are clearly Latin forms or POS tags
+            # Skip empty lines and lines that are clearly Latin forms or POS tags
             if (line and 
-                not re.match(r'^[a-z]+\.[a-z]+\s+[A-Z]', line) and  # Skip "dur.us ADJ" lines
-                not re.match(r'^[a-zA-Z]+,\s*[a-zA-Z]', line) and   # Skip "durus, dura" lines
-                not re.match(r'^\s*$', line) and                    # Skip empty lines
-                not re.search(r'\[XXX[A-Z]\]', line)):              # Skip frequency codes
+                not _STEM_LINE_RE.match(line) and           # Skip "dur.us ADJ" lines
+                not _PARTS_LINE_RE.match(line) and          # Skip "durus, dura" lines
+                not _FREQUENCY_CODE_RE.search(line)):       # Skip frequency codes
                 en_translations.append(line)
         
         translations["en"] = "; ".join(en_translations) if en_translations else ""
@@ -160,7 +181,7 @@ class WhitakerOutputParser:
     def _extract_conjugation(self) -> Optional[int]:
         """Extract verb conjugation number."""
         # Try both formats: with parentheses and without
-        conj_match = re.search(r"V\s*\((\d)(?:st|nd|rd|th)\)", self.raw_output)
+        conj_match = _CONJUGATION_RE.search(self.raw_output)
         if conj_match:
             return int(conj_match.group(1))
         
@@ -168,7 +189,7 @@ class WhitakerOutputParser:
         first_line = self.raw_output.split('\n')[0] if self.raw_output else ""
         if "V" in first_line:
             # Try to extract from patterns like "V   1 1 ..."
-            conj_match = re.search(r"V\s+(\d)\s+\d", first_line)
+            conj_match = _CONJUGATION_CODE_RE.search(first_line)
             if conj_match:
                 return int(conj_match.group(1))
         
@@ -177,7 +198,7 @@ class WhitakerOutputParser:
     def _extract_declension(self) -> Optional[int]:
         """Extract noun/adjective declension number."""
         # Try both formats: with parentheses and without
-        decl_match = re.search(r"(?:N|ADJ)\s*\((\d)(?:st|nd|rd|th)\)", self.raw_output)
+        decl_match = _DECLENSION_RE.search(self.raw_output)
         if decl_match:
             return int(decl_match.group(1))
         
@@ -185,7 +206,7 @@ class WhitakerOutputParser:
         first_line = self.raw_output.split('\n')[0] if self.raw_output else ""
         if "ADJ" in first_line or "N" in first_line:
             # Try to extract from patterns like "ADJ   1 1 ..." or "N   2 1 ..."
-            decl_match = re.search(r"(?:ADJ|N)\s+(\d)\s+\d", first_line)
+            decl_match = _DECLENSION_CODE_RE.search(first_line)
             if decl_match:
                 return int(decl_match.group(1))
         
@@ -196,20 +217,15 @@ class WhitakerOutputParser:
         first_line = self.raw_output.split('\n')[0] if self.raw_output else ""
         
         # Check first line for gender codes
-        if " M " in first_line:
-            return "masculine"
-        elif " F " in first_line:
-            return "feminine"
-        elif " N " in first_line:
-            return "neuter"
+        for code, gender in _GENDER_CODES:
+            if code in first_line:
+                return gender
         
-        # Fallback to text search
-        if "masc" in self.raw_output.lower():
-            return "masculine"
-        elif "fem" in self.raw_output.lower():
-            return "feminine"
-        elif "neut" in self.raw_output.lower():
-            return "neuter"
+        # Fallback to text search; lower-case the output only once
+        raw_lower = self.raw_output.lower()
+        for word, gender in _GENDER_WORDS:
+            if word in raw_lower:
+                return gender
         
         return None
     
@@ -222,7 +238,7 @@ class WhitakerOutputParser:
         # Look for second principal part in the second line
         lines = self.raw_output.strip().split('\n')
         if len(lines) >= 2:
-            parts_match = re.search(r"^[a-zA-Z]+,\s*([a-zA-Z]+)", lines[1])
+            parts_match = _INFINITIVE_RE.search(lines[1])
             return parts_match.group(1).lower() if parts_match else None
         return None
     
@@ -231,7 +247,7 @@ class WhitakerOutputParser:
         # Look for third principal part in the second line
         lines = self.raw_output.strip().split('\n')
         if len(lines) >= 2:
-            parts_match = re.search(r"^[a-zA-Z]+,\s*[a-zA-Z]+,\s*([a-zA-Z]+)", lines[1])
+            parts_match = _PERFECT_RE.search(lines[1])
             return parts_match.group(1).lower() if parts_match else None
         return None
     
@@ -240,7 +256,7 @@ class WhitakerOutputParser:
         # Look for fourth principal part in the second line
         lines = self.raw_output.strip().split('\n')
         if len(lines) >= 2:
-            parts_match = re.search(r"^[a-zA-Z]+,\s*[a-zA-Z]+,\s*[a-zA-Z]+,\s*([a-zA-Z]+)", lines[1])
+            parts_match = _SUPINE_RE.search(lines[1])
             return parts_match.group(1).lower() if parts_match else None
         return None
     
@@ -286,7 +302,7 @@ class WhitakerOutputParser:
         forms = {}
         
         # Extract ablative forms
-        ablative_match = re.findall(r"\b(\w+)\s*\(Abl\)", self.raw_output)
+        ablative_match = _ABLATIVE_RE.findall(self.raw_output)
         if ablative_match:
             forms["ablative"] = [form.lower() for form in ablative_match]
             
@@ -305,13 +321,8 @@ class WhitakerOutputParser:
         # This is a simplified implementation - you'd need to expand this
         # based on the actual Whitaker output format
         forms = []
-        tense_patterns = {
-            "present": r"Pres\s+([a-zA-Z]+)",
-            "perfect": r"Perf\s+([a-zA-Z]+)"
-        }
-        
-        if tense in tense_patterns:
-            matches = re.findall(tense_patterns[tense], self.raw_output)
+        if tense in _TENSE_RES:
+            matches = _TENSE_RES[tense].findall(self.raw_output)
             forms = [match.lower() for match in matches]
             
         return forms
@@ -320,13 +331,8 @@ class WhitakerOutputParser:
         """Extract forms by mood (simplified implementation)."""
         # This is a simplified implementation - you'd need to expand this
         forms = []
-        mood_patterns = {
-            "imperative": r"Imper\s+([a-zA-Z]+)",
-            "subjunctive": r"Subj\s+([a-zA-Z]+)"
-        }
-        
-        if mood in mood_patterns:
-            matches = re.findall(mood_patterns[mood], self.raw_output)
+        if mood in _MOOD_RES:
+            matches = _MOOD_RES[mood].findall(self.raw_output)
             forms = [match.lower() for match in matches]
             
         return forms
@@ -16,6 +16,7 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from flask import Response
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
@@ -161,13 +162,11 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             
             logger.info("Successfully passed parameters to processor")
             
-            # Handle streaming response
-            if stream and hasattr(result, '__iter__') and not isinstance(result, (str, dict, list)):
-                # For streaming responses, collect the entire stream
-                full_response = ""
-                for chunk in result:
-                    if isinstance(chunk, str):
-                        full_response += chunk
+            # Handle streaming response: an SSE Response whose body yields bytes
+            if stream and isinstance(result, Response):
+                # For streaming responses, collect the entire stream; decode once
+                # so multi-byte characters split across chunks survive
+                full_response = b"".join(result.response).decode('utf-8')
                 logger.info(f"Streaming response collected: {len(full_response)} characters")
                 return [TextContent(type="text", text=json.dumps({"content": full_response}, ensure_ascii=False))]
             
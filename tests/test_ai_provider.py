@@ -0,0 +1,488 @@
+# tests/test_ai_provider.py
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+import requests
+from unittest.mock import Mock
+from app.utils.ai_provider import (
+    AIProvider,
+    AIProviderFactory,
+    CachedProvider,
+    LlamaCppProvider,
+    OllamaProvider,
+    OpenAIProvider,
+    RETRY_AFTER_MAX,
+    batch_generate,
+    create_session,
+    stream_chunk_text,
+)
+
+
+def _mock_response(json_data=None, lines=None):
+    response = Mock()
+    response.status_code = 200
+    response.text = ""
+    response.content = json.dumps(json_data).encode('utf-8')
+    response.iter_lines.return_value = iter(lines or [])
+    return response
+
+
+class TestProviderSessions:
+    """Test suite for the pooled HTTP sessions held by the providers"""
+
+    def test_fixed_headers_are_set_once_on_the_session(self):
+        """Content type and authorization live on the session, not on each call"""
+        provider = OpenAIProvider("https://api.example.com/v1", "secret", 30)
+
+        assert provider._session.headers["Authorization"] == "Bearer secret"
+        assert provider._session.headers["Content-Type"] == "application/json; charset=utf-8"
+
+    def test_providers_do_not_share_sessions(self):
+        """Each provider owns its own connection pool"""
+        assert LlamaCppProvider("http://a", 30)._session is not LlamaCppProvider("http://b", 30)._session
+
+    def test_calls_go_through_the_provider_session(self):
+        """Requests use the provider session and no per-call headers"""
+        provider = LlamaCppProvider("http://localhost:8080/", 30)
+        provider._session = Mock()
+        provider._session.post.return_value = _mock_response({"choices": []})
+
+        assert provider.generate_openai_compatible([], "m") == {"choices": []}
+        args, kwargs = provider._session.post.call_args
+        assert args[0] == "http://localhost:8080/v1/chat/completions"
+        assert "headers" not in kwargs
+
+    def test_payload_is_sent_as_utf8_bytes(self):
+        """The request body is pre-encoded UTF-8 JSON rather than json=..."""
+        provider = OpenAIProvider("https://api.example.com/v1", "secret", 30)
+        provider._session = Mock()
+        provider._session.post.return_value = _mock_response({"choices": []})
+
+        provider.generate_openai_compatible([{"role": "user", "content": "Beátus"}], "m")
+
+        kwargs = provider._session.post.call_args.kwargs
+        assert "json" not in kwargs
+        assert isinstance(kwargs["data"], bytes)
+        assert "Beátus".encode("utf-8") in kwargs["data"]
+        assert json.loads(kwargs["data"])["messages"][0]["content"] == "Beátus"
+
+    def test_json_body_is_decoded_as_utf8(self):
+        """Non-streaming bodies are parsed from the raw UTF-8 bytes"""
+        provider = LlamaCppProvider("http://localhost:8080", 30)
+        provider._session = Mock()
+        provider._session.post.return_value = _mock_response({"content": "Beátus vir"})
+
+        assert provider.generate_openai_compatible([], "m") == {"content": "Beátus vir"}
+
+    def test_optional_keys_are_forwarded_when_set(self):
+        """Only supported optional fields with a value reach the payload"""
+        provider = OpenAIProvider("https://api.example.com/v1", "secret", 30)
+        provider._session = Mock()
+        provider._session.post.return_value = _mock_response({"choices": []})
+
+        provider.generate_openai_compatible([], "m", seed=7, stop=None, top_k=5)
+
+        payload = json.loads(provider._session.post.call_args.kwargs["data"])
+        assert payload["seed"] == 7
+        assert "stop" not in payload
+        assert "top_k" not in payload
+
+    @pytest.mark.parametrize("provider", [
+        OllamaProvider("http://localhost:11434", 30),
+        OpenAIProvider("https://api.example.com/v1", "secret", 30),
+        LlamaCppProvider("http://localhost:8080", 30),
+    ])
+    def test_providers_have_no_instance_dict(self, provider):
+        """Provider attributes live in __slots__"""
+        assert not hasattr(provider, "__dict__")
+
+    def test_close_releases_the_session(self):
+        """close() closes the pooled session"""
+        provider = OllamaProvider("http://localhost:11434", 30)
+        provider._session = Mock()
+
+        provider.close()
+
+        provider._session.close.assert_called_once()
+
+
+def _not_found():
+    response = Mock()
+    response.status_code = 404
+    response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=response)
+    return response
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers the first POST with 503 + Retry-After, then with 200"""
+
+    statuses = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        status = self.statuses.pop(0)
+        body = b'{"choices": []}'
+        self.send_response(status)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestProviderRetries:
+    """Test suite for retrying transient upstream statuses"""
+
+    @pytest.fixture
+    def server(self):
+        server = HTTPServer(("127.0.0.1", 0), FlakyHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    def test_transient_status_is_retried(self, server):
+        FlakyHandler.statuses = [503, 200]
+        provider = LlamaCppProvider(f"http://127.0.0.1:{server.server_port}", 5)
+
+        assert provider.generate_openai_compatible([], "m") == {"choices": []}
+        assert FlakyHandler.statuses == []
+
+    def test_retry_after_sleep_is_capped(self):
+        """A long Retry-After is honoured only up to RETRY_AFTER_MAX, also on later attempts"""
+        retry = create_session().get_adapter("http://upstream").max_retries
+        response = Mock(headers={"Retry-After": "3600"})
+
+        assert retry.get_retry_after(response) == RETRY_AFTER_MAX
+        assert retry.increment("POST", "/", response=response).get_retry_after(response) == RETRY_AFTER_MAX
+
+    def test_client_errors_are_not_retried(self, server):
+        FlakyHandler.statuses = [400, 200]
+        provider = LlamaCppProvider(f"http://127.0.0.1:{server.server_port}", 5)
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            provider.generate_openai_compatible([], "m")
+        assert FlakyHandler.statuses == [200]
+
+
+class TestOllamaChatFallback:
+    """Test suite for the /api/chat -> /api/generate fallback"""
+
+    @pytest.fixture
+    def provider(self):
+        provider = OllamaProvider("http://localhost:11434", 30)
+        provider._session = Mock()
+        return provider
+
+    def _urls(self, provider):
+        return [c.args[0].rsplit('/', 1)[-1] for c in provider._session.post.call_args_list]
+
+    def test_missing_chat_endpoint_is_remembered(self, provider):
+        """After one 404 from /api/chat later calls go straight to /api/generate"""
+        provider._session.post.side_effect = [
+            _not_found(), _mock_response({"response": "a"}), _mock_response({"response": "b"}),
+        ]
+        messages = [{"role": "user", "content": "hi"}]
+
+        assert provider.generate_openai_compatible(messages, "m") == {"response": "a"}
+        assert provider.generate_openai_compatible(messages, "m") == {"response": "b"}
+        assert self._urls(provider) == ["chat", "generate", "generate"]
+
+    def test_chat_is_flattened_for_generate(self, provider):
+        """The fallback prompt is a role-prefixed transcript ending with the assistant turn"""
+        provider._chat_supported = False
+        provider._session.post.return_value = _mock_response({"response": "ok"})
+        messages = [
+            {"role": "system", "content": "Be brief"},
+            {"role": "user", "content": "Hi"},
+            {"role": "tool", "content": "ignored"},
+            {"role": "assistant", "content": "Hello"},
+            {"content": "Again"},
+        ]
+
+        provider.generate_openai_compatible(messages, "m")
+
+        prompt = json.loads(provider._session.post.call_args.kwargs["data"])["prompt"]
+        assert prompt == "System: Be brief\nUser: Hi\nAssistant: Hello\nUser: Again\nAssistant: "
+
+    def test_multi_part_content_is_flattened(self, provider):
+        """OpenAI content parts contribute their text; image parts are dropped"""
+        provider._chat_supported = False
+        provider._session.post.return_value = _mock_response({"response": "ok"})
+        messages = [{"role": "user", "content": [
+            {"type": "text", "text": "Describe"},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,AA=="}},
+            {"type": "text", "text": "briefly"},
+        ]}]
+
+        provider.generate_openai_compatible(messages, "m")
+
+        prompt = json.loads(provider._session.post.call_args.kwargs["data"])["prompt"]
+        assert prompt == "User: Describe\nbriefly\nAssistant: "
+
+    def test_failed_fallback_is_not_remembered(self, provider):
+        """A 404 that /api/generate also returns (e.g. unknown model) keeps /api/chat"""
+        provider._session.post.side_effect = [_not_found(), _not_found(), _mock_response({"message": {}})]
+        messages = [{"role": "user", "content": "hi"}]
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            provider.generate_openai_compatible(messages, "m")
+        provider.generate_openai_compatible(messages, "m")
+
+        assert self._urls(provider) == ["chat", "generate", "chat"]
+
+
+class SlowEchoProvider(AIProvider):
+    """Blocking provider that records how many calls overlap"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, model, stream=False, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if prompt == "boom":
+            raise RuntimeError("upstream failed")
+        return {"prompt": prompt, "stream": stream}
+
+    def generate_openai_compatible(self, messages, model, stream=False, **kwargs):
+        return self.generate(messages[-1]["content"], model, stream, **kwargs)
+
+
+class TestAsyncGeneration:
+    """Test suite for the asyncio wrappers around the blocking providers"""
+
+    def test_agenerate_is_non_streaming(self):
+        provider = SlowEchoProvider(delay=0)
+        result = asyncio.run(provider.agenerate_openai_compatible([{"role": "user", "content": "hi"}], "m"))
+
+        assert result == {"prompt": "hi", "stream": False}
+
+    def test_batch_runs_concurrently_in_order(self):
+        """Prompts overlap up to the concurrency limit and keep their order"""
+        provider = SlowEchoProvider()
+        results = asyncio.run(batch_generate(provider, ["a", "b", "c", "d"], "m", concurrency=2))
+
+        assert [r["prompt"] for r in results] == ["a", "b", "c", "d"]
+        assert provider.peak == 2
+
+    def test_batch_returns_failures_in_place(self):
+        """One failing prompt does not cancel the others"""
+        results = asyncio.run(batch_generate(SlowEchoProvider(delay=0), ["a", "boom"], "m"))
+
+        assert results[0]["prompt"] == "a"
+        assert isinstance(results[1], RuntimeError)
+
+
+class TestGenerateBatch:
+    """Test suite for batched completion"""
+
+    def test_native_batch_sends_one_request(self):
+        """OpenAI-compatible servers get every prompt in a single /completions call"""
+        provider = LlamaCppProvider("http://localhost:8080", 30)
+        provider._session = Mock()
+        provider._session.post.return_value = _mock_response({"choices": [
+            {"index": 1, "text": "second"},
+            {"index": 0, "text": "first"},
+        ]})
+
+        assert provider.generate_batch(["a", "b"], "m") == ["first", "second"]
+        provider._session.post.assert_called_once()
+        args, kwargs = provider._session.post.call_args
+        assert args[0] == "http://localhost:8080/v1/completions"
+        assert json.loads(kwargs["data"])["prompt"] == ["a", "b"]
+
+    def test_default_batch_runs_single_calls(self):
+        """Providers without a batch endpoint fall back to concurrent single calls"""
+        provider = OllamaProvider("http://localhost:11434", 30)
+        provider._session = Mock()
+        provider._session.post.side_effect = lambda url, **kwargs: _mock_response(
+            {"response": json.loads(kwargs["data"])["prompt"].upper()})
+
+        assert provider.generate_batch(["a", "b", "c"], "m") == ["A", "B", "C"]
+        assert provider._session.post.call_count == 3
+
+    def test_native_batch_forwards_optional_keys(self):
+        """Optional keys such as stop and seed reach the /completions payload"""
+        provider = OpenAIProvider("https://api.example.com/v1", "secret", 30)
+        provider._session = Mock()
+        provider._session.post.return_value = _mock_response({"choices": []})
+
+        provider.generate_batch(["a"], "m", stop=["\n"], seed=7, tools=[{"type": "function"}])
+
+        payload = json.loads(provider._session.post.call_args.kwargs["data"])
+        assert payload["stop"] == ["\n"]
+        assert payload["seed"] == 7
+        assert "tools" not in payload
+
+    @pytest.mark.parametrize("provider", [
+        OllamaProvider("http://localhost:11434", 30),
+        OpenAIProvider("https://api.example.com/v1", "secret", 30),
+        LlamaCppProvider("http://localhost:8080", 30),
+    ])
+    def test_failures_are_returned_in_place(self, provider):
+        """Every provider returns the error for each prompt instead of raising"""
+        provider._session = Mock()
+        provider._session.post.side_effect = requests.ConnectionError("down")
+
+        results = provider.generate_batch(["a", "b"], "m")
+
+        assert len(results) == 2
+        assert all(isinstance(r, requests.ConnectionError) for r in results)
+
+    def test_running_event_loop_is_rejected(self):
+        """Inside asyncio code the caller is pointed at batch_generate"""
+        async def call():
+            return SlowEchoProvider(delay=0).generate_batch(["a"], "m")
+
+        with pytest.raises(RuntimeError, match="await batch_generate"):
+            asyncio.run(call())
+
+
+class TestCachedProvider:
+    """Test suite for the exact-match response cache"""
+
+    @pytest.fixture
+    def inner(self):
+        inner = Mock(spec=AIProvider)
+        inner.generate_openai_compatible.side_effect = lambda messages, model, stream, **kw: {
+            "content": messages[-1]["content"]}
+        return inner
+
+    def _ask(self, provider, content, **kwargs):
+        return provider.generate_openai_compatible([{"role": "user", "content": content}], "m", **kwargs)
+
+    def test_deterministic_calls_are_cached(self, inner):
+        provider = CachedProvider(inner)
+
+        assert self._ask(provider, "a", temperature=0) == {"content": "a"}
+        assert self._ask(provider, "a", temperature=0) == {"content": "a"}
+        assert inner.generate_openai_compatible.call_count == 1
+
+    def test_sampling_and_streaming_bypass_the_cache(self, inner):
+        provider = CachedProvider(inner)
+
+        self._ask(provider, "a")
+        self._ask(provider, "a")
+        self._ask(provider, "a", temperature=0, stream=True)
+
+        assert inner.generate_openai_compatible.call_count == 3
+
+    def test_any_option_change_is_a_miss(self, inner):
+        provider = CachedProvider(inner)
+
+        self._ask(provider, "a", temperature=0, max_tokens=10)
+        self._ask(provider, "a", temperature=0, max_tokens=20)
+
+        assert inner.generate_openai_compatible.call_count == 2
+
+    def test_least_recently_used_entry_is_evicted(self, inner):
+        provider = CachedProvider(inner, max_entries=2)
+
+        for content in ("a", "b", "a", "c", "a", "b"):
+            self._ask(provider, content, temperature=0)
+
+        # a, b, c miss; a hit; c evicts b; a hit; b misses again
+        assert inner.generate_openai_compatible.call_count == 4
+
+    def test_cached_results_are_isolated(self, inner):
+        """Mutating a returned response does not corrupt the cache"""
+        provider = CachedProvider(inner)
+
+        self._ask(provider, "a", temperature=0)["content"] = "changed"
+
+        assert self._ask(provider, "a", temperature=0) == {"content": "a"}
+
+    def test_factory_wraps_when_configured(self):
+        config = {"AI_PROVIDER": "ollama", "OLLAMA_BASE_URL": "http://localhost:11434",
+                  "REQUEST_TIMEOUT": 30, "RESPONSE_CACHE_SIZE": 8}
+        provider = AIProviderFactory.create_provider(config)
+
+        assert isinstance(provider, CachedProvider)
+        assert isinstance(provider.provider, OllamaProvider)
+
+
+class TestGenerateStream:
+    """Test suite for incremental text streaming"""
+
+    def test_sse_frames_yield_delta_text(self):
+        provider = LlamaCppProvider("http://localhost:8080", 30)
+        provider._session = Mock()
+        provider._session.post.return_value = _mock_response(lines=[
+            b'data: {"choices":[{"delta":{"role":"assistant"}}]}',
+            b'',
+            'data: {"choices":[{"delta":{"content":"Beá"}}]}'.encode('utf-8'),
+            b': keep-alive',
+            b'data: {"choices":[{"delta":{"content":"tus"}}]}',
+            b'data: [DONE]',
+        ])
+
+        assert list(provider.generate_stream([], "m")) == ["Beá", "tus"]
+        assert provider._session.post.call_args.kwargs["stream"] is True
+
+    def test_stream_lines_are_not_decoded(self):
+        """Streaming calls hand back raw UTF-8 byte lines"""
+        provider = OllamaProvider("http://localhost:11434", 30)
+        provider._session = Mock()
+        provider._session.post.return_value = _mock_response(lines=[b'{"message":{"content":"a"}}'])
+
+        provider.generate_openai_compatible([], "m", stream=True)
+
+        provider._session.post.return_value.iter_lines.assert_called_once_with()
+
+    def test_ollama_ndjson_lines(self):
+        assert stream_chunk_text(b'{"message":{"content":"vir"},"done":false}') == "vir"
+        assert stream_chunk_text('{"response":"qui","done":false}') == "qui"
+
+    def test_non_json_lines_are_ignored(self):
+        assert stream_chunk_text(b'data: not json') is None
+        assert stream_chunk_text(b'data: {broken') is None
+
+
+class TestAIProviderFactory:
+    """Test suite for provider selection"""
+
+    @pytest.mark.parametrize("name, cls", [
+        ("openai", OpenAIProvider),
+        ("llama.cpp", LlamaCppProvider),
+        ("ollama", OllamaProvider),
+    ])
+    def test_provider_type_selects_class(self, name, cls):
+        assert isinstance(AIProviderFactory.create_provider(self._config(name)), cls)
+
+    def test_unknown_type_falls_back_to_ollama(self):
+        assert isinstance(AIProviderFactory.create_provider(self._config("other")), OllamaProvider)
+
+    def test_equal_settings_share_one_provider(self):
+        """Repeated calls reuse the provider and its connection pool"""
+        first = AIProviderFactory.create_provider(self._config("llama"))
+
+        assert AIProviderFactory.create_provider(self._config("llamacpp")) is first
+        assert AIProviderFactory.create_provider(self._config("llamacpp", REQUEST_TIMEOUT=60)) is not first
+
+    @staticmethod
+    def _config(name, **overrides):
+        config = {
+            "AI_PROVIDER": name,
+            "OPENAI_BASE_URL": "https://api.example.com/v1",
+            "OPENAI_API_KEY": "secret",
+            "LLAMACPP_BASE_URL": "http://localhost:8080",
+            "OLLAMA_BASE_URL": "http://localhost:11434",
+            "REQUEST_TIMEOUT": 30,
+        }
+        config.update(overrides)
+        return config
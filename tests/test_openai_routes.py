@@ -0,0 +1,239 @@
+# tests/test_openai_routes.py
+import gzip
+import json
+import pytest
+from flask import Flask, jsonify
+from app.routes.openai_routes import (
+    openai_bp,
+    _handle_passthrough_non_streaming,
+    _handle_passthrough_streaming,
+    _should_passthrough,
+)
+
+
+class TestShouldPassthrough:
+    """Test suite for the passthrough routing decision"""
+
+    def test_tooling_metadata_triggers_passthrough(self):
+        """Non-empty tooling fields route the request to the provider untouched"""
+        assert _should_passthrough({'tools': [{'type': 'function'}]}, [])
+        assert _should_passthrough({'response_format': {'type': 'json_object'}}, [])
+
+    def test_empty_tooling_metadata_is_ignored(self):
+        """Empty tooling fields do not force passthrough"""
+        assert not _should_passthrough({'tools': [], 'tool_choice': None}, [])
+
+    def test_tool_calls_in_history_trigger_passthrough(self):
+        """Assistant tool calls in the history force passthrough"""
+        messages = [{'role': 'user', 'content': 'hi'},
+                    {'role': 'assistant', 'tool_calls': [{'id': 'call_1'}]}]
+        assert _should_passthrough({}, messages)
+
+    def test_plain_chat_is_not_passthrough(self):
+        """Ordinary chat requests go through pattern detection"""
+        assert not _should_passthrough({'model': 'm'}, [{'role': 'user', 'content': 'hi'}])
+
+
+class TestPassthroughStreaming:
+    """Test suite for the SSE passthrough generator"""
+
+    @pytest.fixture
+    def flask_app(self):
+        """Bare Flask app; the passthrough helpers only need an app context"""
+        return Flask(__name__)
+
+    def _stream(self, flask_app, lines):
+        with flask_app.app_context():
+            response = _handle_passthrough_streaming(iter(lines), 'test-model')
+            return b''.join(response.response)
+
+    def test_data_lines_are_forwarded(self, flask_app):
+        """Plain data lines, blank separators and [DONE] survive the passthrough"""
+        chunk = {"choices": [{"index": 0, "delta": {"content": "Hello"}}]}
+        body = self._stream(flask_app, [
+            'data: ' + json.dumps(chunk),
+            '',
+            'data: [DONE]',
+        ])
+
+        lines = body.split(b'\n')
+        assert json.loads(lines[0][6:]) == chunk
+        assert lines[1] == b''
+        assert lines[2] == b'data: [DONE]'
+
+    def test_ascii_lines_are_forwarded_verbatim(self, flask_app):
+        """Chunks that cannot contain mojibake skip the JSON round-trip"""
+        line = 'data: {"choices": [{"index": 0, "delta": {"content": "Hi"}}]}'
+        body = self._stream(flask_app, [line])
+
+        assert body == line.encode('utf-8') + b'\n'
+
+    def test_non_data_frames_are_forwarded_verbatim(self, flask_app):
+        """Comment and event frames are never parsed, even when non-ASCII"""
+        body = self._stream(flask_app, [': café', 'event: ping'])
+
+        assert body == ': café\nevent: ping\n'.encode('utf-8')
+
+    def test_latin1_mojibake_is_repaired(self, flask_app):
+        """UTF-8 content mis-decoded as latin-1 upstream is restored"""
+        garbled = 'é'.encode('utf-8').decode('latin1')
+        chunk = {"choices": [{"index": 0, "delta": {"content": garbled}}]}
+        body = self._stream(flask_app, ['data: ' + json.dumps(chunk)])
+
+        data = json.loads(body.decode('utf-8').split('\n')[0][6:])
+        assert data['choices'][0]['delta']['content'] == 'é'
+
+    def test_only_non_ascii_fields_are_repaired(self, flask_app):
+        """ASCII and null content survive alongside a field that needs repair"""
+        garbled = 'é'.encode('utf-8').decode('latin1')
+        chunk = {"choices": [
+            {"index": 0, "delta": {"content": garbled}},
+            {"index": 1, "delta": {"content": "plain"}},
+            {"index": 2, "delta": {"content": None}},
+        ]}
+        body = self._stream(flask_app, ['data: ' + json.dumps(chunk)])
+
+        choices = json.loads(body.decode('utf-8').split('\n')[0][6:])['choices']
+        assert [c['delta']['content'] for c in choices] == ['é', 'plain', None]
+
+    def test_gzip_when_accepted(self, flask_app):
+        """Clients sending Accept-Encoding: gzip receive a gzipped stream"""
+        with flask_app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            response = _handle_passthrough_streaming(iter([b'data: [DONE]']), 'test-model')
+            body = b''.join(response.response)
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(body) == b'data: [DONE]\n'
+
+    def test_no_gzip_when_refused(self, flask_app):
+        """Accept-Encoding: gzip;q=0 refuses gzip, so the stream stays plain"""
+        with flask_app.test_request_context(headers={'Accept-Encoding': 'gzip;q=0'}):
+            response = _handle_passthrough_streaming(iter([b'data: [DONE]']), 'test-model')
+            body = b''.join(response.response)
+
+        assert 'Content-Encoding' not in response.headers
+        assert body == b'data: [DONE]\n'
+
+    def test_bytes_lines_are_accepted(self, flask_app):
+        """Providers that yield raw bytes are handled like str lines"""
+        body = self._stream(flask_app, [b': keep-alive', b'data: [DONE]'])
+
+        assert body == b': keep-alive\ndata: [DONE]\n'
+
+
+class TestPassthroughNonStreaming:
+    """Test suite for the non-streaming passthrough response"""
+
+    def test_response_is_utf8_json(self):
+        """Provider JSON is returned as UTF-8 without ASCII escaping"""
+        upstream = {"choices": [{"message": {"role": "assistant", "content": "Benedictus é"}}]}
+        with Flask(__name__).app_context():
+            response = _handle_passthrough_non_streaming(upstream, 'test-model')
+
+        assert response.headers['Content-Type'] == 'application/json; charset=utf-8'
+        assert 'Benedictus é'.encode('utf-8') in response.get_data()
+        assert json.loads(response.get_data()) == upstream
+
+
+class StubRouter:
+    """Records what chat_completions hands to the processor router"""
+
+    def __init__(self):
+        self.calls = []
+        self.ai_provider = None
+
+    def route_request(self, detection_result, model, stream, original_data):
+        self.calls.append(detection_result)
+        return jsonify({"ok": True})
+
+
+class TestChatCompletions:
+    """Test suite for the pattern-detection path of /v1/chat/completions"""
+
+    @pytest.fixture
+    def router(self):
+        return StubRouter()
+
+    @pytest.fixture
+    def client(self, router):
+        flask_app = Flask(__name__)
+        flask_app.config['processor_router'] = router
+        flask_app.register_blueprint(openai_bp)
+        return flask_app.test_client()
+
+    def _post(self, client, messages):
+        return client.post('/v1/chat/completions', json={'model': 'm', 'messages': messages})
+
+    def test_structured_user_message_is_routed(self, client, router):
+        """The last user message is pattern-detected and routed"""
+        message = "### processor: latin\n### pattern: latin_analysis\n### word_form: abiit"
+        response = self._post(client, [{'role': 'user', 'content': message}])
+
+        assert response.status_code == 200
+        assert router.calls[0]['processor'] == 'latin_processor'
+        assert router.calls[0]['pattern_data']['word_form'] == 'abiit'
+
+    def test_processor_from_history_is_applied(self, client, router):
+        """A processor header earlier in the conversation applies to a plain follow-up"""
+        messages = [
+            {'role': 'system', 'content': '### processor: latin\n### pattern: latin_analysis\n### word_form: abiit'},
+            {'role': 'user', 'content': 'and what about the perfect tense?'},
+        ]
+        self._post(client, messages)
+
+        result = router.calls[0]
+        assert result['processor'] == 'latin_processor'
+        assert result['specified_processor'] is True
+        assert result['pattern_data'] == {'pattern': 'custom', 'prompt': 'and what about the perfect tense?'}
+
+    def test_plain_message_defaults_to_custom_prompt(self, client, router):
+        """Without any processor header the router gets a custom prompt"""
+        self._post(client, [{'role': 'user', 'content': 'hello there'}])
+
+        assert router.calls[0] == {'pattern': 'custom', 'prompt': 'hello there'}
+
+    def test_malformed_json_is_rejected(self, client, router):
+        """A body that is not valid JSON returns 400"""
+        response = client.post('/v1/chat/completions', data=b'{"messages": [',
+                               content_type='application/json')
+
+        assert response.status_code == 400
+        assert router.calls == []
+
+    @pytest.mark.parametrize('body', [b'null', b'[{"role": "user"}]', b'7'])
+    def test_non_object_json_is_rejected(self, client, router, body):
+        """Valid JSON that is not an object returns 400 instead of failing on .get"""
+        response = client.post('/v1/chat/completions', data=body,
+                               content_type='application/json')
+
+        assert response.status_code == 400
+        assert router.calls == []
+
+    def test_each_app_uses_its_own_router(self, client, router):
+        """Registering the blueprint on a second app does not redirect the first"""
+        other_router = StubRouter()
+        other_app = Flask(__name__)
+        other_app.config['processor_router'] = other_router
+        other_app.register_blueprint(openai_bp)
+
+        self._post(client, [{'role': 'user', 'content': 'hello there'}])
+
+        assert router.calls == [{'pattern': 'custom', 'prompt': 'hello there'}]
+        assert other_router.calls == []
+
+    def test_router_replaced_in_config_is_used(self, client, router):
+        """A router swapped into the app config after registration takes effect"""
+        replacement = StubRouter()
+        client.application.config['processor_router'] = replacement
+        self._post(client, [{'role': 'user', 'content': 'hello there'}])
+
+        assert router.calls == []
+        assert replacement.calls == [{'pattern': 'custom', 'prompt': 'hello there'}]
+
+    def test_missing_user_message_is_rejected(self, client, router):
+        """Requests without a user message return 400"""
+        response = self._post(client, [{'role': 'system', 'content': 'be brief'}])
+
+        assert response.status_code == 400
+        assert router.calls == []
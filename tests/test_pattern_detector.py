@@ -1,7 +1,8 @@
 # tests/test_pattern_detector.py
 import pytest
 import re
-from app.utils.pattern_detector import PatternDetector
+import threading
+from app.utils.pattern_detector import PatternDetector, create_pattern_detector
 
 
 class TestPatternDetector:
@@ -455,4 +456,73 @@ Some additional text here."""
         result = detector.detect_pattern(chat_payload)
         assert result is not None
         assert result["processor"] == "code_processor"
-        assert result["pattern_data"]["prompt"].startswith("Write a hello")
\ No newline at end of file
+        assert result["pattern_data"]["prompt"].startswith("Write a hello")
+
+    def test_state_machine_header_parsing(self, detector):
+        """Header keys must be word characters directly followed by a colon"""
+        machine = detector.state_machine
+        machine._parse_header("###word_form:  abiit ")
+        machine._parse_header("### Pattern: latin_analysis")
+        machine._parse_header("### not a key: ignored")
+        machine._parse_header("### no colon here")
+
+        assert machine.result == {'word_form': 'abiit', 'pattern': 'latin_analysis'}
+
+    def test_state_machine_stops_once_complete(self, detector):
+        """Lines after a complete pattern are not parsed"""
+        message = "### processor: latin\n### word_form: abiit\n### pattern: latin_analysis\n### context: ignored"
+        result = detector.state_machine.process(message)
+
+        assert result['processor'] == 'latin_processor'
+        assert 'context' not in result['pattern_data']
+
+    def test_state_machine_collects_code_block(self, detector):
+        """Fenced code lines are joined in order, leading blank lines dropped"""
+        message = "### processor: code\n```python\n\ndef f():\n\n    return 1\n```\n### pattern: explain_code"
+        result = detector.state_machine.process(message)
+
+        assert result['processor'] == 'code_processor'
+        assert result['pattern_data']['code'] == 'def f():\n\nreturn 1'
+
+    def test_state_machine_value_on_next_line(self, detector):
+        """A header with an empty value takes its text from the following lines"""
+        message = "### processor: code\n### pattern: custom\n### prompt:\nWrite a factorial function\nin Python"
+        result = detector.state_machine.process(message)
+
+        assert result['pattern_data']['prompt'] == 'Write a factorial function\nin Python'
+
+    def test_state_machine_open_fence_at_end(self, detector):
+        """An opened fence followed only by a trailing newline yields empty code"""
+        message = "### processor: code\n### task: sort a list\n```python\n"
+        result = detector.state_machine.process(message)
+
+        assert result['pattern_data']['code'] == ''
+
+    def test_state_machine_skips_leading_prose(self, detector):
+        """Lines before the first header or fence are ignored"""
+        message = "Please help.\n#not a header\n  ### processor: latin\n### pattern: latin_analysis\n### word_form: abiit"
+        result = detector.state_machine.process(message)
+
+        assert result['processor'] == 'latin_processor'
+        assert result['pattern_data']['word_form'] == 'abiit'
+
+    def test_detect_pattern_caches_repeated_message(self, detector):
+        """Repeated messages are answered from the cache with an independent copy"""
+        message = "### processor: latin\n### pattern: latin_analysis\n### word_form: abiit"
+        first = detector.detect_pattern(message)
+        first['pattern_data']['word_form'] = 'changed'
+        second = detector.detect_pattern(message)
+
+        assert second['pattern_data']['word_form'] == 'abiit'
+        assert second == detector._detect_from_text(message)
+        assert detector.detect_pattern("hello there") is None
+
+    def test_factory_reuses_detector_per_thread(self):
+        """create_pattern_detector shares one instance per thread, never across threads"""
+        other = []
+        worker = threading.Thread(target=lambda: other.append(create_pattern_detector()))
+        worker.start()
+        worker.join()
+
+        assert create_pattern_detector() is create_pattern_detector()
+        assert other[0] is not create_pattern_detector()
@@ -0,0 +1,51 @@
+# tests/test_psalm_rag_processor.py
+import json
+import pytest
+from flask import Flask
+from app.processors.psalm_rag_processor import PsalmRAGProcessor
+
+
+class TestPsalmStreaming:
+    """Test suite for the Ollama to OpenAI SSE conversion"""
+
+    @pytest.fixture
+    def processor(self):
+        # The stream formatter needs no Cassandra connection
+        return PsalmRAGProcessor.__new__(PsalmRAGProcessor)
+
+    def _events(self, processor, lines):
+        with Flask(__name__).app_context():
+            response = processor._format_streaming_response(iter(lines), 'test-model', context=[])
+            body = b''.join(response.response)
+        return [event[6:] for event in body.decode('utf-8').split('\n\n') if event]
+
+    def test_chunks_share_id_and_timestamp(self, processor):
+        """Every chunk of one stream carries the same id and created time"""
+        events = self._events(processor, [
+            b'{"message": {"content": "Beatus"}, "done": false}',
+            b'{"message": {"content": " vir"}, "done": false}',
+            b'{"message": {"content": ""}, "done": true}',
+        ])
+
+        assert events[-1] == '[DONE]'
+        chunks = [json.loads(event) for event in events[:-1]]
+        assert [c['choices'][0]['delta'].get('content') for c in chunks] == ['Beatus', ' vir', None]
+        assert chunks[-1]['choices'][0]['finish_reason'] == 'stop'
+        assert len({c['id'] for c in chunks}) == 1
+        assert len({c['created'] for c in chunks}) == 1
+
+    def test_invalid_lines_are_skipped(self, processor):
+        """Lines that are not JSON do not break the stream"""
+        events = self._events(processor, [b'not json', b'{"response": "Amen"}'])
+
+        assert json.loads(events[0])['choices'][0]['delta']['content'] == 'Amen'
+
+    def test_non_ascii_content_is_utf8(self, processor):
+        """Content is emitted as UTF-8 rather than \\u escapes"""
+        with Flask(__name__).app_context():
+            response = processor._format_streaming_response(
+                iter(['{"response": "grātia"}'.encode('utf-8')]), 'test-model', context=[])
+            body = b''.join(response.response)
+
+        assert 'grātia'.encode('utf-8') in body
+        assert body.endswith(b'data: [DONE]\n\n')
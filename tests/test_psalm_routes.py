@@ -0,0 +1,108 @@
+# tests/test_psalm_routes.py
+import pytest
+from flask import Flask, Response
+from app.routes.psalm_routes import psalm_bp
+
+
+class StubPsalmProcessor:
+    """Records the payloads the psalm routes build"""
+
+    def __init__(self, result=None):
+        self.calls = []
+        self.result = result if result is not None else {"answer": "ok"}
+
+    def process(self, pattern_data, model, stream, original_data):
+        self.calls.append((pattern_data, model, stream))
+        return self.result
+
+    def health_check(self):
+        return {"status": "healthy"}
+
+
+class TestPsalmRoutes:
+    """Test suite for the psalm convenience endpoints"""
+
+    @pytest.fixture
+    def processor(self):
+        return StubPsalmProcessor()
+
+    @pytest.fixture
+    def client(self, processor):
+        flask_app = Flask(__name__)
+        flask_app.config['psalm_processor'] = processor
+        flask_app.register_blueprint(psalm_bp)
+        return flask_app.test_client()
+
+    def test_query_psalm_builds_payload(self, client, processor):
+        """query_psalm forwards the augustine_psalm_query payload"""
+        response = client.post('/api/query_psalm', json={'psalm_number': 1, 'question': 'Why?'})
+
+        assert response.status_code == 200
+        assert response.get_json() == {"answer": "ok"}
+        payload, model, stream = processor.calls[0]
+        assert payload['pattern'] == 'augustine_psalm_query'
+        assert payload['psalm_number'] == 1
+        assert payload['question'] == 'Why?'
+        assert payload['max_tokens'] == 2000
+        assert stream is False
+
+    def test_analyze_psalm_word_builds_payload(self, client, processor):
+        """analyze_psalm_word forwards the psalm_word_analysis payload"""
+        client.post('/api/analyze_psalm_word',
+                    json={'word_form': 'abiit', 'psalm_number': 1, 'model': 'm'})
+
+        payload, model, stream = processor.calls[0]
+        assert payload['pattern'] == 'psalm_word_analysis'
+        assert payload['word_form'] == 'abiit'
+        assert model == 'm'
+
+    def test_missing_fields_are_rejected(self, client, processor):
+        """Required fields are validated before the processor is called"""
+        assert client.post('/api/query_psalm', json={'question': 'Why?'}).status_code == 400
+        assert client.post('/api/analyze_psalm_word', json={'psalm_number': 1}).status_code == 400
+        assert processor.calls == []
+
+    def test_malformed_json_is_rejected(self, client, processor):
+        """A body that is not valid JSON returns 400"""
+        response = client.post('/api/query_psalm', data=b'{"psalm_number": ',
+                               content_type='application/json')
+
+        assert response.status_code == 400
+        assert processor.calls == []
+
+    def test_non_object_json_is_rejected(self, client, processor):
+        """A JSON array body returns 400 rather than an internal error"""
+        response = client.post('/api/query_psalm', data=b'[1]',
+                               content_type='application/json')
+
+        assert response.status_code == 400
+        assert processor.calls == []
+
+    def test_error_tuple_keeps_status(self, client, processor):
+        """A (payload, status) tuple from the processor keeps its status code"""
+        processor.result = ({"error": "bad"}, 400)
+        response = client.post('/api/query_psalm', json={'psalm_number': 1})
+
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "bad"}
+
+    def test_streaming_response_is_returned_as_is(self, client, processor):
+        """A streaming Response from the processor reaches the client unchanged"""
+        processor.result = Response(iter(['data: [DONE]\n\n']), mimetype='text/event-stream')
+        response = client.post('/api/query_psalm', json={'psalm_number': 1, 'stream': True})
+
+        assert response.mimetype == 'text/event-stream'
+        assert response.get_data() == b'data: [DONE]\n\n'
+
+    def test_uninitialized_processor_is_reported(self):
+        """Without a psalm processor in config the health check reports the error"""
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(psalm_bp)
+        response = flask_app.test_client().get('/api/psalm_health')
+
+        assert response.status_code == 500
+        assert 'not initialized' in response.get_json()['error']
+
+    def test_health(self, client):
+        """Health endpoint reports the processor status"""
+        assert client.get('/api/psalm_health').get_json() == {"status": "healthy"}
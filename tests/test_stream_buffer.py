@@ -0,0 +1,93 @@
+# tests/test_stream_buffer.py
+import gzip
+import zlib
+import pytest
+from app.utils import stream_buffer
+from app.utils.stream_buffer import StreamBuffer, coalesce, gzip_stream
+
+
+class TestStreamBuffer:
+    """Test suite for the SSE write-coalescing buffer"""
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        """Controllable replacement for time.monotonic"""
+        now = [0.0]
+        monkeypatch.setattr(stream_buffer, 'monotonic', lambda: now[0])
+        return now
+
+    def test_small_chunks_are_batched(self, clock):
+        """Chunks arriving inside the flush window are yielded together"""
+        chunks = list(coalesce(['data: a\n', b'data: b\n', 'data: c\n']))
+
+        assert chunks == [b'data: a\ndata: b\ndata: c\n']
+
+    def test_flush_on_size(self, clock):
+        """A batch is flushed as soon as it reaches the byte threshold"""
+        chunks = list(coalesce([b'ab', b'cd', b'e'], max_bytes=4))
+
+        assert chunks == [b'abcd', b'e']
+
+    def test_flush_on_interval(self, clock):
+        """A batch is flushed once the interval since the last flush elapses"""
+        def upstream():
+            yield b'a'
+            yield b'b'
+            clock[0] = 1.0
+            yield b'c'
+            yield b'd'
+
+        assert list(coalesce(upstream())) == [b'abc', b'd']
+
+    def test_complete_event_is_not_held_for_slow_upstream(self, clock):
+        """Each event is yielded once its blank line arrives, before upstream resumes"""
+        resumed = []
+
+        def slow_upstream():
+            for n in range(2):
+                yield f'data: {n}\n'
+                yield '\n'
+                resumed.append(n)
+                clock[0] += 0.2
+
+        stream = coalesce(slow_upstream())
+
+        assert next(stream) == b'data: 0\n\n'
+        assert resumed == []
+        # After the pause the data line is flushed at once; its blank line
+        # still closes the event without waiting for more upstream chunks
+        assert next(stream) == b'data: 1\n'
+        assert next(stream) == b'\n'
+        assert resumed == [0]
+
+    def test_first_chunk_after_idle_is_not_delayed(self, clock):
+        """A chunk arriving after a quiet period is flushed immediately"""
+        buffer = StreamBuffer()
+        clock[0] = 5.0
+        buffer.append(b'data: first\n')
+
+        assert buffer.due()
+        assert buffer.flush() == b'data: first\n'
+        assert not buffer.due()
+
+    def test_non_ascii_is_utf8_encoded(self, clock):
+        """String chunks are encoded as UTF-8 bytes"""
+        assert b''.join(coalesce(['data: é\n'])) == 'data: é\n'.encode('utf-8')
+
+
+class TestGzipStream:
+    """Test suite for incremental gzip of streamed batches"""
+
+    def test_round_trip(self):
+        """The concatenated output is one valid gzip member"""
+        chunks = ['data: {"a": 1}\n\n', b'data: [DONE]\n\n']
+
+        assert gzip.decompress(b''.join(gzip_stream(chunks))) == b'data: {"a": 1}\n\ndata: [DONE]\n\n'
+
+    def test_each_chunk_is_decodable_on_arrival(self):
+        """Sync flushes let the client decode every chunk without waiting for the end"""
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        stream = gzip_stream([b'data: first\n\n', b'data: second\n\n'])
+
+        assert decoder.decompress(next(stream)) == b'data: first\n\n'
+        assert decoder.decompress(next(stream)) == b'data: second\n\n'